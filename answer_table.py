@@ -0,0 +1,164 @@
+# answer_table.py
+
+import argparse
+import re
+from collections import Counter
+from datetime import datetime, timezone
+
+import torch
+
+from query_log import load_query_log
+
+# Session used while generating answers, cleared afterwards so it never grows
+_BUILD_SESSION = "__answer_table__"
+
+# Generated answers that must not be served from the table
+_UNUSABLE_PREFIXES = (
+    "Apologies, I couldn't locate",
+    "API Error",
+    "Error in",
+    "Hugging Face API key is missing",
+)
+
+
+def normalize_query(query):
+    """
+    Lookup key for a query: lowercase words without punctuation, e.g. 'What's the price?' -> 'what s the price'.
+    """
+    return ' '.join(re.sub(r'[^\w\s]', ' ', query.lower()).split())
+
+
+def mine_frequent_queries(queries, max_queries=5000):
+    """
+    Counts queries by their normalized form.
+
+    Rare forms are kept: they may be paraphrases of a frequent question,
+    and cluster_paraphrases applies min_count to the cluster totals.
+
+    Args:
+        queries (list): Raw queries, e.g. from load_query_log.
+        max_queries (int): Most distinct forms considered, most frequent first.
+
+    Returns:
+        list: (normalized query, count, most common raw spelling) tuples, most frequent first.
+    """
+    counts = Counter()
+    spellings = {}
+    for query in queries:
+        key = normalize_query(query)
+        if not key:
+            continue
+        counts[key] += 1
+        spellings.setdefault(key, Counter())[query.strip()] += 1
+
+    frequent = []
+    for key, count in counts.most_common(max_queries):
+        frequent.append((key, count, spellings[key].most_common(1)[0][0]))
+    return frequent
+
+
+def cluster_paraphrases(frequent, encoder, similarity=0.9, min_count=3):
+    """
+    Groups paraphrased queries by embedding similarity.
+
+    Queries are visited most frequent first; each joins the first cluster
+    whose leading query it matches closely enough, or starts a new one.
+
+    Args:
+        frequent (list): Output of mine_frequent_queries.
+        encoder: SentenceTransformer-compatible query encoder.
+        similarity (float): Minimum cosine similarity to a cluster's leading query.
+        min_count (int): Clusters asked fewer times than this in total are dropped.
+
+    Returns:
+        list: Clusters as {'query', 'count', 'members'}, most frequent first.
+    """
+    if not frequent:
+        return []
+    embeddings = encoder.encode([key for key, _, _ in frequent], convert_to_tensor=True)
+    embeddings = torch.nn.functional.normalize(embeddings.float(), dim=-1)
+
+    clusters, leaders = [], []
+    for position, (key, count, spelling) in enumerate(frequent):
+        if leaders:
+            scores = embeddings[leaders] @ embeddings[position]
+            best = int(torch.argmax(scores))
+            if float(scores[best]) >= similarity:
+                clusters[best]['members'].append(key)
+                clusters[best]['count'] += count
+                continue
+        leaders.append(position)
+        clusters.append({'query': spelling, 'count': count, 'members': [key]})
+
+    clusters = [cluster for cluster in clusters if cluster['count'] >= min_count]
+    clusters.sort(key=lambda cluster: cluster['count'], reverse=True)
+    return clusters
+
+
+def build_answer_table(assistant, queries, max_answers=300, similarity=0.9, min_count=3):
+    """
+    Pre-generates answers for the most frequent question clusters.
+
+    Answers come from the assistant's normal retrieval and generation path,
+    against the index version it is serving now.
+
+    Args:
+        assistant (AIChatAssistant): Assistant serving the index the table is for.
+        queries (list): Logged queries to mine.
+        max_answers (int): Clusters to answer, most frequent first.
+        similarity (float): Cosine similarity for two queries to count as paraphrases.
+        min_count (int): Times a cluster must have been asked to be answered.
+
+    Returns:
+        dict: {'_index_version', '_built_at', 'answers': {normalized query: answer}, 'clusters': [...]}
+    """
+    version = assistant.data_store.get('_index_version')
+    frequent = mine_frequent_queries(queries)
+    clusters = cluster_paraphrases(frequent, assistant.vectorizer, similarity, min_count)[:max_answers]
+
+    answers, answered = {}, []
+    try:
+        for cluster in clusters:
+            answer = assistant._answer(cluster['query'], session_id=_BUILD_SESSION)
+            if not answer or answer.startswith(_UNUSABLE_PREFIXES):
+                continue
+            cluster['answer'] = answer
+            answered.append(cluster)
+            for member in cluster['members']:
+                answers[member] = answer
+    finally:
+        assistant.conversations.clear(_BUILD_SESSION)
+
+    print(f"Answer table for index version {version}: {len(answered)} of {len(clusters)} clusters answered, {len(answers)} lookup keys.")
+    return {
+        '_index_version': version,
+        '_built_at': datetime.now(timezone.utc).isoformat(),
+        'answers': answers,
+        'clusters': answered,
+    }
+
+
+if __name__ == "__main__":
+    from chatbot_module import AIChatAssistant
+    from index_manager import IndexManager
+
+    parser = argparse.ArgumentParser(description="Pre-generate answers for frequent questions against the live index.")
+    parser.add_argument("--queries", default="query_log.jsonl", help="Query log: one query per line, or JSON lines with 'query'.")
+    parser.add_argument("--index", default="index", help="IndexManager directory.")
+    parser.add_argument("--max-answers", type=int, default=300)
+    parser.add_argument("--min-count", type=int, default=3)
+    parser.add_argument("--similarity", type=float, default=0.9)
+    parser.add_argument("--api-url", help="Inference API base URL.")
+    args = parser.parse_args()
+
+    index_manager = IndexManager(args.index)
+    processed_data = index_manager.load()
+    if not processed_data:
+        raise SystemExit("No processed data found. Build an index with main.py first.")
+
+    chat_assistant = AIChatAssistant(processed_data, api_url=args.api_url)
+    answer_table = build_answer_table(
+        chat_assistant, load_query_log(args.queries),
+        max_answers=args.max_answers, similarity=args.similarity, min_count=args.min_count
+    )
+    index_manager.save_answer_table(answer_table)
@@ -0,0 +1,170 @@
+# bench_fixtures.py
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Vocabulary for the synthetic pages; mixes product terms with filler so chunks differ
+_VOCABULARY = (
+    "chatbot pricing plan lead generation whatsapp website integration support customer "
+    "marketing automation appointment booking analytics dashboard agent live chat template "
+    "ecommerce order tracking payment partner affiliate commission plugin api webhook "
+    "the a of to and for with on in is are your our can will from by this that it"
+).split()
+
+
+def synthetic_page(page_id, num_pages, words=600, links=20):
+    """
+    Renders one deterministic synthetic page.
+
+    Args:
+        page_id (int): Page number; the same id always renders the same page.
+        num_pages (int): Size of the site, used to pick link targets.
+        words (int): Words of body text.
+        links (int): Outgoing links to other pages.
+
+    Returns:
+        str: The page HTML.
+    """
+    rng = random.Random(page_id)
+    sentences = []
+    remaining = words
+    while remaining > 0:
+        length = min(remaining, rng.randint(8, 20))
+        sentences.append(' '.join(rng.choice(_VOCABULARY) for _ in range(length)).capitalize() + '.')
+        remaining -= length
+
+    # Skew links towards low page ids so in-degree is uneven, like a real site
+    targets = {int(num_pages * rng.random() ** 2) for _ in range(links)}
+    anchors = ''.join(f'<li><a href="/page/{target}">Page {target}</a></li>' for target in sorted(targets))
+
+    return (
+        f"<html><head><title>Page {page_id}</title><style>body {{ margin: 0; }}</style></head><body>"
+        "<nav><a href=\"/\">Home</a> Login Contact Us Get Started FREE</nav>"
+        f"<main><h1>Page {page_id}</h1><p>{' '.join(sentences)}</p><ul>{anchors}</ul></main>"
+        "<script>window.analytics = true;</script></body></html>"
+    )
+
+
+class FixtureSiteHandler(BaseHTTPRequestHandler):
+    """
+    Serves a synthetic site: /page/<n>, /robots.txt and /sitemap.xml.
+    """
+    num_pages = 10
+    words_per_page = 600
+
+    def do_GET(self):
+        if self.path == "/robots.txt":
+            host = self.headers.get("Host")
+            return self._send(f"User-agent: *\nSitemap: http://{host}/sitemap.xml\n", "text/plain")
+        if self.path == "/sitemap.xml":
+            host = self.headers.get("Host")
+            entries = ''.join(
+                f"<url><loc>http://{host}/page/{page_id}</loc><lastmod>2024-01-01</lastmod></url>"
+                for page_id in range(self.num_pages)
+            )
+            body = f'<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</urlset>'
+            return self._send(body, "application/xml")
+        if self.path == "/":
+            return self._send(synthetic_page(0, self.num_pages, self.words_per_page), "text/html")
+        if self.path.startswith("/page/"):
+            try:
+                page_id = int(self.path[len("/page/"):])
+            except ValueError:
+                page_id = -1
+            if 0 <= page_id < self.num_pages:
+                return self._send(synthetic_page(page_id, self.num_pages, self.words_per_page), "text/html")
+        self.send_error(404)
+
+    def _send(self, body, content_type):
+        payload = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output readable
+
+
+class MockInferenceHandler(BaseHTTPRequestHandler):
+    """
+    Answers Hugging Face Inference API calls after an injected delay.
+    """
+    latency_ms = 200.0
+    jitter_ms = 0.0
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self.send_error(400)
+            return
+
+        delay = max(0.0, random.gauss(self.latency_ms, self.jitter_ms)) if self.jitter_ms else self.latency_ms
+        time.sleep(delay / 1000)
+
+        prompt_words = len(str(payload.get("inputs", "")).split())
+        body = json.dumps([{"generated_text": f"Mock answer based on a {prompt_words}-word prompt."}]).encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _FixtureServer(ThreadingHTTPServer):
+    # The default listen backlog of 5 drops connections under load-test concurrency
+    request_queue_size = 1024
+
+
+def _start_server(handler_class):
+    server = _FixtureServer(("127.0.0.1", 0), handler_class)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def start_fixture_site(num_pages=10, words_per_page=600):
+    """
+    Starts the synthetic site on a free local port.
+
+    Returns:
+        tuple: The running server (call shutdown() when done) and its base URL.
+    """
+    handler = type("SiteHandler", (FixtureSiteHandler,), {"num_pages": num_pages, "words_per_page": words_per_page})
+    server = _start_server(handler)
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def start_mock_inference(latency_ms=200.0, jitter_ms=0.0):
+    """
+    Starts the mock inference endpoint on a free local port.
+
+    Returns:
+        tuple: The running server and the base URL to use as AIChatAssistant's api_url.
+    """
+    handler = type("InferenceHandler", (MockInferenceHandler,), {"latency_ms": latency_ms, "jitter_ms": jitter_ms})
+    server = _start_server(handler)
+    return server, f"http://127.0.0.1:{server.server_address[1]}/models"
+
+
+if __name__ == "__main__":
+    site, site_url = start_fixture_site(num_pages=1000)
+    inference, inference_url = start_mock_inference(latency_ms=200)
+    print(f"Fixture site: {site_url}/sitemap.xml")
+    print(f"Mock inference API: {inference_url} (set HF_API_URL to use it)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        site.shutdown()
+        inference.shutdown()
@@ -0,0 +1,229 @@
+# benchmark.py
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from bench_fixtures import start_fixture_site, start_mock_inference
+from chatbot_module import AIChatAssistant
+from query_encoder import current_rss_bytes
+from retrieval_report import sample_queries
+from scraper_mod import scrape_page
+from text_processing import (
+    cleanse_text,
+    compute_section_centroids,
+    generate_embeddings,
+    prune_segments,
+    segment_text,
+)
+
+
+class PeakRSS:
+    """
+    Samples the process RSS on a background thread and keeps the peak.
+    """
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss_bytes())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = current_rss_bytes()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss_bytes())
+
+
+def run_stage(items, func):
+    """
+    Calls `func` once per item, timing every call.
+
+    Returns:
+        tuple: The call results and a stats dict with count, total time, throughput,
+        p50/p95/p99 latency in milliseconds and peak RSS in MB.
+    """
+    results, samples = [], []
+    with PeakRSS() as rss, open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        stage_start = time.perf_counter()
+        for item in items:
+            start = time.perf_counter()
+            results.append(func(item))
+            samples.append((time.perf_counter() - start) * 1000)
+        total = time.perf_counter() - stage_start
+
+    samples = np.array(samples) if samples else np.zeros(1)
+    return results, {
+        'count': len(results),
+        'total_s': total,
+        'throughput_per_s': len(results) / total if total else 0.0,
+        'p50_ms': float(np.percentile(samples, 50)),
+        'p95_ms': float(np.percentile(samples, 95)),
+        'p99_ms': float(np.percentile(samples, 99)),
+        'peak_rss_mb': rss.peak / 2**20,
+    }
+
+
+def run_benchmarks(pages=10, queries=50, inference_latency_ms=200.0, embedding_model='all-MiniLM-L6-v2'):
+    """
+    Runs every pipeline stage against a local fixture site and mock inference API.
+
+    Args:
+        pages (int): Size of the synthetic site.
+        queries (int): Queries for the retrieval, generation and end-to-end stages.
+        inference_latency_ms (float): Delay injected by the mock inference endpoint.
+        embedding_model (str): SentenceTransformer model for the index.
+
+    Returns:
+        dict: Stage stats keyed by stage name, plus the whole build as 'pipeline_build'.
+    """
+    site, site_url = start_fixture_site(num_pages=pages)
+    inference, api_url = start_mock_inference(latency_ms=inference_latency_ms)
+    stages = {}
+    try:
+        labels = [f"Page {page_id}" for page_id in range(pages)]
+        build_start = time.perf_counter()
+
+        scraped, stages['scrape_page'] = run_stage(
+            labels, lambda label: scrape_page(f"{site_url}/page/{label.split()[-1]}", label, "main")[0] or ""
+        )
+        cleaned, stages['cleanse_text'] = run_stage(scraped, cleanse_text)
+        segmented, stages['segment_text'] = run_stage(
+            cleaned, lambda text: prune_segments(segment_text(text, size=500), threshold=50)
+        )
+        embedded, stages['generate_embeddings'] = run_stage(
+            [(label, segments) for label, segments in zip(labels, segmented) if segments],
+            lambda item: (item[0], item[1], generate_embeddings(item[1], model_type=embedding_model)[0])
+        )
+        stages['generate_embeddings']['chunks'] = sum(len(segments) for _, segments, _ in embedded)
+
+        data_store = {}
+        for label, segments, embeddings in embedded:
+            centroid, _ = compute_section_centroids(embeddings)
+            data_store[label] = {'chunks': segments, 'embeddings': embeddings, 'centroid': centroid, 'link_prior': 0.0}
+        data_store['_embedding_model'] = embedding_model
+
+        build_total = time.perf_counter() - build_start
+        stages['pipeline_build'] = {
+            'count': pages,
+            'total_s': build_total,
+            'throughput_per_s': pages / build_total if build_total else 0.0,
+        }
+
+        assistant = AIChatAssistant(data_store, api_url=api_url)
+        query_texts = sample_queries(data_store, num_queries=queries)
+
+        _, stages['_find_best_chunk'] = run_stage(query_texts, assistant._find_best_chunk)
+        prompts = [f"Context: {query}\n\nQuery: {query}\n\nResponse:" for query in query_texts]
+        _, stages['_use_huggingface_api'] = run_stage(prompts, assistant._use_huggingface_api)
+        _, stages['get_response'] = run_stage(query_texts, assistant.get_response)
+    finally:
+        site.shutdown()
+        inference.shutdown()
+    return stages
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(baseline, current, tolerance=0.10):
+    """
+    Lists stages whose latency or throughput regressed beyond `tolerance`.
+
+    Args:
+        baseline (dict): Earlier results JSON.
+        current (dict): New results JSON.
+        tolerance (float): Allowed relative change, e.g. 0.10 for 10%.
+
+    Returns:
+        list: Human-readable regression descriptions.
+    """
+    regressions = []
+    for stage, stats in current['stages'].items():
+        previous = baseline.get('stages', {}).get(stage)
+        if not previous:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'peak_rss_mb'):
+            if metric in stats and previous.get(metric):
+                change = stats[metric] / previous[metric] - 1
+                if change > tolerance:
+                    regressions.append(f"{stage} {metric}: {previous[metric]:.2f} -> {stats[metric]:.2f} (+{change:.0%})")
+        if previous.get('throughput_per_s'):
+            change = stats['throughput_per_s'] / previous['throughput_per_s'] - 1
+            if change < -tolerance:
+                regressions.append(
+                    f"{stage} throughput_per_s: {previous['throughput_per_s']:.2f} -> "
+                    f"{stats['throughput_per_s']:.2f} ({change:.0%})"
+                )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the scraping, processing and chat pipeline.")
+    parser.add_argument("--pages", type=int, default=10, help="Synthetic site size (10 to 100000 pages).")
+    parser.add_argument("--queries", type=int, default=50, help="Queries for the retrieval and generation stages.")
+    parser.add_argument("--inference-latency-ms", type=float, default=200.0, help="Mock inference API delay.")
+    parser.add_argument("--embedding-model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write the results JSON.")
+    parser.add_argument("--compare", help="Earlier results JSON to check for regressions.")
+    args = parser.parse_args()
+
+    stage_stats = run_benchmarks(args.pages, args.queries, args.inference_latency_ms, args.embedding_model)
+    results = {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'pages': args.pages,
+            'queries': args.queries,
+            'inference_latency_ms': args.inference_latency_ms,
+            'embedding_model': args.embedding_model,
+        },
+        'stages': stage_stats,
+    }
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+
+    print(f"{'stage':22s} {'count':>7s} {'per_s':>9s} {'p50_ms':>9s} {'p95_ms':>9s} {'p99_ms':>9s} {'rss_mb':>8s}")
+    for stage, stats in stage_stats.items():
+        print(
+            f"{stage:22s} {stats['count']:7d} {stats['throughput_per_s']:9.2f} "
+            f"{stats.get('p50_ms', float('nan')):9.2f} {stats.get('p95_ms', float('nan')):9.2f} "
+            f"{stats.get('p99_ms', float('nan')):9.2f} {stats.get('peak_rss_mb', float('nan')):8.1f}"
+        )
+    print(f"Results written to {args.output}.")
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline_results = json.load(file)
+        regressions = compare_results(baseline_results, results)
+        if regressions:
+            print(f"Regressions against {args.compare} (commit {baseline_results['meta'].get('commit')}):")
+            for line in regressions:
+                print(f"  {line}")
+            raise SystemExit(1)
+        print(f"No regressions against {args.compare}.")
@@ -0,0 +1,136 @@
+# chat_server.py
+
+import argparse
+import json
+import pickle
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import metrics
+from chatbot_module import AIChatAssistant, is_error_response
+from index_manager import IndexManager
+from sharded_index import ShardedIndex
+
+
+def make_chat_handler(assistant):
+    """
+    Builds a request handler class bound to one AIChatAssistant.
+
+    Endpoints:
+        POST /chat          {"query": "...", "site": optional shard, "session_id": optional}
+                            -> {"response": "..."}, or 502 {"error": "..."} if generation failed
+        GET  /health        liveness check
+        GET  /metrics       Prometheus text (when metrics are enabled)
+        GET  /metrics.json  JSON metrics snapshot
+    """
+    class ChatHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep-alive, so load tests measure the assistant rather than TCP setup
+
+        def do_POST(self):
+            if self.path != "/chat":
+                return self._send_json(404, {"error": "not found"})
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+                query = body.get("query", "").strip()
+            except (json.JSONDecodeError, AttributeError):
+                return self._send_json(400, {"error": "expected a JSON object"})
+            if not query:
+                return self._send_json(400, {"error": "query cannot be empty"})
+            session_id = str(body.get("session_id", "default"))
+            response = assistant.get_response(query, site=body.get("site"), session_id=session_id)
+            if is_error_response(response):
+                return self._send_json(502, {"error": response})
+            self._send_json(200, {"response": response})
+
+        def do_GET(self):
+            if self.path == "/health":
+                return self._send_json(200, {"status": "ok"})
+            if self.path == "/metrics":
+                return self._send(200, metrics.render_prometheus(), "text/plain; version=0.0.4")
+            if self.path == "/metrics.json":
+                return self._send_json(200, metrics.snapshot())
+            self._send_json(404, {"error": "not found"})
+
+        def _send_json(self, status, body):
+            self._send(status, json.dumps(body), "application/json")
+
+        def _send(self, status, body, content_type):
+            payload = body.encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ChatHandler
+
+
+class ChatServer(ThreadingHTTPServer):
+    # The default listen backlog of 5 drops connections under many concurrent users
+    request_queue_size = 1024
+
+
+def serve_chat(assistant, port=8000, host="127.0.0.1", background=False):
+    """
+    Serves an assistant over HTTP, one thread per connection.
+
+    Args:
+        assistant (AIChatAssistant): The assistant answering /chat requests.
+        port (int): Port to listen on (0 picks a free port).
+        host (str): Interface to bind.
+        background (bool): Serve from a daemon thread and return immediately.
+
+    Returns:
+        ThreadingHTTPServer: The server; its address is in `server_address`.
+    """
+    server = ChatServer((host, port), make_chat_handler(assistant))
+    server.daemon_threads = True
+    if background:
+        threading.Thread(target=server.serve_forever, name="chat-server", daemon=True).start()
+    else:
+        print(f"Chat server listening on http://{host}:{server.server_address[1]}/chat")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.shutdown()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the chat assistant over HTTP.")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--data", help="Processed data pickle (defaults to the live version under index/).")
+    parser.add_argument("--api-url", help="Inference API base URL, e.g. a local mock for load tests.")
+    parser.add_argument("--metrics", action="store_true", help="Collect metrics and expose them on /metrics.")
+    parser.add_argument("--shards", help="Serve a multi-site sharded index from this directory.")
+    parser.add_argument("--embedding-model", default="all-MiniLM-L6-v2", help="Embedding model of the shards.")
+    parser.add_argument("--memory-budget-mb", type=float, default=512, help="Memory allowed for loaded shards.")
+    parser.add_argument("--query-log", help="Log incoming queries to this JSON lines file for answer_table.py.")
+    args = parser.parse_args()
+
+    if args.metrics:
+        metrics.enable()
+
+    if args.shards:
+        sharded_index = ShardedIndex(args.shards, args.embedding_model, args.memory_budget_mb)
+        chat_assistant = AIChatAssistant(None, api_url=args.api_url, shards=sharded_index, query_log=args.query_log)
+    else:
+        answer_table = None
+        if args.data:
+            with open(args.data, "rb") as file:
+                processed_data = pickle.load(file)
+        else:
+            index_manager = IndexManager("index")
+            processed_data = index_manager.load()
+            answer_table = index_manager.load_answer_table()
+        if not processed_data:
+            raise SystemExit("No processed data found. Build an index with main.py or pass --data.")
+        chat_assistant = AIChatAssistant(
+            processed_data, api_url=args.api_url, query_log=args.query_log, answer_table=answer_table
+        )
+
+    serve_chat(chat_assistant, port=args.port)
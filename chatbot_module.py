@@ -2,14 +2,157 @@ import os
 import json
 import requests
 import torch
-import numpy as np
-from sentence_transformers import SentenceTransformer
+
+import metrics
+from answer_table import normalize_query
+from context_packer import ContextPacker
+from query_encoder import load_query_encoder
+from query_log import QueryLog
+from session_store import ConversationStore
+from text_processing import ensure_section_centroids
 
 # Set your Hugging Face API key here or through an environment variable
 HUGGINGFACE_API_KEY = os.getenv("HF_API_KEY", "hf_your_token_here")
 
+# Base URL of the inference API; point it at a local mock server for benchmarks
+HUGGINGFACE_API_URL = os.getenv("HF_API_URL", "https://api-inference.huggingface.co/models")
+
+# Prints per-query prompt token usage; metrics.py keeps the totals when enabled
+DEBUG = os.getenv("CHATBOT_DEBUG", "0") == "1"
+
+# Start of every response get_response returns when generation failed
+ERROR_PREFIXES = (
+    "Error in generating response",
+    "API Error",
+    "Error in API response parsing",
+    "Hugging Face API key is missing",
+)
+
+def is_error_response(response_text):
+    """
+    True if get_response returned an error message instead of an answer.
+    """
+    return response_text.startswith(ERROR_PREFIXES)
+
+PROMPT_TEMPLATE = (
+    "You are an intelligent assistant. Use the given context to answer the query accurately and succinctly. "
+    "If the context is inadequate, mention this.\n\n"
+    "Context: {context}\n\n"
+    "Query: {query}\n\n"
+    "Response:"
+)
+
+def build_routing(data_store):
+    """
+    Stacks every section's centroid and sub-centroids into one matrix.
+
+    Returns:
+        tuple: Normalized centroid matrix, the section name owning each row,
+        and the list of searchable sections.
+    """
+    ensure_section_centroids(data_store)
+    sections, owners, rows = [], [], []
+    for section, section_data in data_store.items():
+        if section.startswith("_") or not section_data.get("chunks"):
+            continue
+        sections.append(section)
+        section_rows = [section_data["centroid"].unsqueeze(0)]
+        if section_data.get("sub_centroids") is not None:
+            section_rows.append(section_data["sub_centroids"])
+        for row in torch.cat(section_rows):
+            rows.append(row)
+            owners.append(section)
+
+    if not rows:
+        return None, owners, sections
+    matrix = torch.nn.functional.normalize(torch.stack(rows).float(), dim=-1)
+    return matrix, owners, sections
+
+def route_sections(input_vector, routing, top_sections=3, routing_margin=0.02):
+    """
+    Picks the sections worth scanning for a query.
+
+    Each section is scored by its best-matching centroid. Only the top
+    `top_sections` are kept, unless the cut-off is too close to call,
+    in which case every section is returned.
+
+    Returns:
+        list: Section names to scan.
+    """
+    matrix, owners, sections = routing
+    if matrix is None or top_sections is None or len(sections) <= top_sections:
+        return sections
+
+    query = torch.nn.functional.normalize(input_vector.float().to(matrix.device), dim=-1)
+    centroid_scores = (matrix @ query).tolist()
+    section_scores = {}
+    for owner, score in zip(owners, centroid_scores):
+        if score > section_scores.get(owner, -1.0):
+            section_scores[owner] = score
+
+    ranked = sorted(section_scores, key=section_scores.get, reverse=True)
+    cutoff_gap = section_scores[ranked[top_sections - 1]] - section_scores[ranked[top_sections]]
+    if cutoff_gap < routing_margin:
+        return sections
+    return ranked[:top_sections]
+
+def rank_chunks(
+    input_vector, index, top_n=3, threshold=0.3, top_sections=3, routing_margin=0.02, full_scan=False, link_weight=0.0
+):
+    """
+    Scores the chunks of one index against an encoded query.
+
+    Args:
+        input_vector (torch.Tensor): Encoded query.
+        index (tuple): (data_store, routing) as built by build_routing.
+        top_n (int): Number of top chunks to keep per section.
+        threshold (float): Minimum similarity score.
+        top_sections (int): Sections to scan after centroid routing (None for all).
+        routing_margin (float): Score gap below which routing falls back to a full scan.
+        full_scan (bool): Skip centroid routing and scan every section.
+        link_weight (float): Weight of a section's link prior (how much of the site links
+            to the page) added to its chunk scores. The threshold applies before it.
+
+    Returns:
+        list: (score, section, chunk_index, chunk_text) tuples, best first.
+    """
+    data_store, routing = index
+    sections = routing[2] if full_scan else route_sections(input_vector, routing, top_sections, routing_margin)
+
+    ranked = []
+    for section in sections:
+        section_data = data_store[section]
+        section_embeddings = section_data["embeddings"]
+
+        # Compute similarity
+        cosine_scores = torch.nn.functional.cosine_similarity(input_vector, section_embeddings, dim=-1)
+        top_scores, top_indices = torch.topk(cosine_scores, k=min(top_n, len(section_data["chunks"])))
+
+        # The prior is per section, so it only reorders chunks across sections
+        boost = link_weight * section_data.get("link_prior", 0.0)
+        for score, chunk_index in zip(top_scores.tolist(), top_indices.tolist()):
+            if score >= threshold:
+                ranked.append((score + boost, section, chunk_index, section_data["chunks"][chunk_index]))
+
+    ranked.sort(key=lambda match: match[0], reverse=True)
+    return ranked
+
 class AIChatAssistant:
-    def __init__(self, data_store, model_id="google/flan-t5-base"):
+    def __init__(
+        self,
+        data_store,
+        model_id="google/flan-t5-base",
+        top_sections=3,
+        routing_margin=0.02,
+        query_encoder="float",
+        api_url=None,
+        shards=None,
+        conversations=None,
+        context_packer=None,
+        query_log=None,
+        answer_table=None,
+        link_weight=0.05
+    ):
         """
         AI Chat Assistant utilizing chunk-based retrieval and Hugging Face API for text generation.
 
@@ -19,110 +162,257 @@ class AIChatAssistant:
                   "SectionName": {
                     "chunks": [...],
                     "embeddings": <torch.Tensor of shape [num_chunks, embedding_dim]>,
-                    "references": {...}
+                    "centroid": <torch.Tensor of shape [embedding_dim]>,
+                    "sub_centroids": <torch.Tensor of shape [k, embedding_dim] or None>,
+                    "url": <page URL>,
+                    "link_prior": <link importance of the page in [0, 1]>
                   },
                   ...
                   "_embedding_model": <name of embedding model used>
                 }
             model_id (str): ID of the Hugging Face model for text generation.
+            top_sections (int): Number of sections whose chunks are scanned after centroid
+                routing. None always scans every section.
+            routing_margin (float): If the last routed section and the first skipped one
+                score within this margin, the query falls back to a full scan.
+            query_encoder (str): "float", "int8" or "onnx"; run query_encoder.py to check
+                that a faster encoder still agrees with the index before serving it.
+            api_url (str): Base URL of the inference API (defaults to HF_API_URL).
+            shards (ShardedIndex): Multi-site index to search instead of `data_store`,
+                which may then be None.
+            conversations (ConversationStore): Per-session history store (defaults to a
+                bounded in-memory store counting tokens with the context packer's tokenizer).
+            context_packer (ContextPacker): Fills the prompt with retrieved chunks up to the
+                model's input limit (defaults to one for `model_id`).
+            query_log (str): JSON lines file to log incoming queries to, mined by
+                answer_table.py (optional).
+            answer_table (dict): Pre-generated answers for frequent questions, used
+                only while it matches the served index version (optional).
+            link_weight (float): Score boost for chunks from pages that much of the site
+                links to; 0 ranks by similarity alone.
         """
-        self.data_store = data_store
+        # Section centroids let a query skip sections that cannot contain the answer
+        self.top_sections = top_sections
+        self.routing_margin = routing_margin
+        self.link_weight = link_weight
+
+        # Data and routing table live in one tuple so a refresh can swap both in a single assignment
+        self.shards = shards
+        self._index = (data_store, build_routing(data_store)) if data_store is not None else (None, None)
 
         # Load the embedding model used in preprocessing
-        embedding_model_name = self.data_store.get("_embedding_model", "all-MiniLM-L6-v2")
-        self.vectorizer = SentenceTransformer(embedding_model_name)
+        if shards is not None:
+            embedding_model_name = shards.embedding_model
+        else:
+            embedding_model_name = data_store.get("_embedding_model", "all-MiniLM-L6-v2")
+        self.vectorizer = load_query_encoder(embedding_model_name, mode=query_encoder)
 
         # Hugging Face model information
         self.model_id = model_id
         self.api_key = HUGGINGFACE_API_KEY
+        self.api_url = (api_url or HUGGINGFACE_API_URL).rstrip("/")
+        self.context_packer = context_packer if context_packer is not None else ContextPacker(model_id)
+
+        # Conversation history per session, bounded by turns, tokens and total memory.
+        # Token caps are counted with the generation model's tokenizer, like the prompt budget.
+        if conversations is None:
+            conversations = ConversationStore(token_counter=self.context_packer.count_tokens)
+        self.conversations = conversations
 
-        # Maintain conversation history if needed
-        self.chat_history = []
+        # Frequent questions are answered from a table built offline for the current index version
+        self.query_log = QueryLog(query_log) if query_log else None
+        self._answer_table = answer_table
 
-    def get_response(self, query):
+    @property
+    def chat_history(self):
+        """
+        Messages of the default session, for single-user console use.
+
+        This is a read-only snapshot: appending to the returned list does not
+        change the stored history. Use conversations.append(session_id, role, content).
+        """
+        return self.conversations.get("default")
+
+    def get_response(self, query, site=None, session_id="default"):
         """
         Generate a response based on user's query using retrieval and Hugging Face API.
 
         Steps:
-          1) Retrieve the most suitable chunk for the query.
-          2) Construct a prompt using the retrieved chunk.
+          1) Retrieve the most suitable chunks for the query.
+          2) Pack as many of them as fit the model's input limit into a prompt.
           3) Generate a response via Hugging Face API.
+
+        Args:
+            query (str): The user's question.
+            site (str): Shard to answer from when serving a ShardedIndex (optional).
+            session_id (str): Conversation the query belongs to.
         """
+        metrics.inc("queries_total")
+        if self.query_log is not None:
+            self.query_log.record(query, session_id, site)
         try:
-            # Find the most relevant chunk
-            context_chunk = self._find_best_chunk(query)
+            with metrics.span("get_response"):
+                answer = self._lookup_answer(query)
+                if answer is not None:
+                    metrics.inc("answer_table_hits_total")
+                    self.conversations.append(session_id, "user", query)
+                    self.conversations.append(session_id, "assistant", answer)
+                    return answer
+                return self._answer(query, site, session_id)
+        except Exception as err:
+            metrics.inc("response_errors_total")
+            return f"Error in generating response: {err}"
 
-            if not context_chunk or context_chunk == "No matching context found.":
-                return "Apologies, I couldn't locate relevant information. Could you rephrase or elaborate?"
+    def set_answer_table(self, answer_table):
+        """
+        Installs pre-generated answers; see answer_table.build_answer_table.
+        """
+        self._answer_table = answer_table
 
-            # Create a prompt with the retrieved context
-            prompt = (
-                "You are an intelligent assistant. Use the given context to answer the query accurately and succinctly. "
-                "If the context is inadequate, mention this.
+    def _lookup_answer(self, query):
+        """
+        Returns the pre-generated answer for a query, or None to answer it live.
+        """
+        answer_table = self._answer_table
+        if answer_table is None or self.shards is not None:
+            return None
+        # A table built for another index version would serve answers the current data no longer supports
+        if answer_table.get('_index_version') != self.data_store.get('_index_version'):
+            return None
+        return answer_table['answers'].get(normalize_query(query))
+
+    def _answer(self, query, site=None, session_id="default"):
+        """
+        Retrieval, prompt building and generation behind get_response.
+        """
+        # Find the most relevant chunks
+        ranked = self._find_chunks(query, site=site)
+
+        if not ranked:
+            metrics.inc("no_context_total")
+            return "Apologies, I couldn't locate relevant information. Could you rephrase or elaborate?"
+
+        # Fill the model's input budget with the best chunks instead of sending one oversized chunk
+        with metrics.span("prompt_build"):
+            prompt, pack_stats = self.context_packer.pack(ranked, PROMPT_TEMPLATE, query)
+        if DEBUG:
+            print(
+                f"[debug] prompt: {pack_stats['tokens_sent']}/{pack_stats['token_budget']} tokens, "
+                f"{pack_stats['context_tokens']} of context from {pack_stats['chunks_packed']} chunks "
+                f"({pack_stats['chunks_trimmed']} trimmed), query truncated: {pack_stats['query_truncated']}"
+            )
 
-"
-                f"Context: {context_chunk}
+        # Generate the answer via Hugging Face API
+        with metrics.span("generation_http"):
+            response_text = self._use_huggingface_api(prompt)
 
-"
-                f"Query: {query}
+        # Save conversation history
+        self.conversations.append(session_id, "user", query)
+        self.conversations.append(session_id, "assistant", response_text)
 
-"
-                "Response:"
-            )
+        return response_text
 
-            # Generate the answer via Hugging Face API
-            response_text = self._use_huggingface_api(prompt)
+    @property
+    def data_store(self):
+        """
+        The processed data currently being served.
+        """
+        return self._index[0]
 
-            # Save conversation history
-            self.chat_history.append({"role": "user", "content": query})
-            self.chat_history.append({"role": "assistant", "content": response_text})
+    @property
+    def _routing(self):
+        return self._index[1]
 
-            return response_text
-        except Exception as err:
-            return f"Error in generating response: {err}"
+    def swap_data_store(self, new_data_store):
+        """
+        Atomically replaces the served data, e.g. after a background index refresh.
+
+        The routing table is built before the swap, and queries already running
+        keep using the snapshot they started with. The old data is released once
+        those queries finish.
 
-    def _find_best_chunk(self, input_text, top_n=3, threshold=0.3):
+        Args:
+            new_data_store (dict): Processed data built with the same embedding model.
+
+        Returns:
+            dict: The data that was being served before the swap.
         """
-        Identify the most relevant chunk for the input query using cosine similarity.
+        if self.shards is not None:
+            raise ValueError("Sharded assistants refresh per shard through ShardedIndex.refresh_shard.")
+        current_model = self.data_store.get("_embedding_model", "all-MiniLM-L6-v2")
+        new_model = new_data_store.get("_embedding_model", "all-MiniLM-L6-v2")
+        if new_model != current_model:
+            raise ValueError(f"Cannot swap in data embedded with {new_model}; the assistant encodes queries with {current_model}.")
+
+        new_index = (new_data_store, build_routing(new_data_store))
+        old_index, self._index = self._index, new_index
+        return old_index[0]
+
+    def _route_sections(self, input_vector, routing):
+        """
+        Picks the sections worth scanning for a query; see route_sections.
+        """
+        return route_sections(input_vector, routing, self.top_sections, self.routing_margin)
+
+    def _rank_chunks(self, input_vector, top_n=3, threshold=0.3, full_scan=False, site=None):
+        """
+        Scores chunks against an encoded query, scanning only the routed sections.
 
         Args:
-            input_text (str): User's input query.
-            top_n (int): Number of top chunks to evaluate.
+            input_vector (torch.Tensor): Encoded query.
+            top_n (int): Number of top chunks to keep per section.
             threshold (float): Minimum similarity score.
+            full_scan (bool): Skip centroid routing and scan every section.
+            site (str): Shard to search when serving a ShardedIndex; None fans out to all shards.
 
         Returns:
-            str: The best matching chunk text or fallback message if none is found.
+            list: (score, section, chunk_index, chunk_text) tuples, best first.
         """
-        input_vector = self.vectorizer.encode(input_text, convert_to_tensor=True)
-        matching_chunks = []
-        similarity_scores = []
-
-        for section, section_data in self.data_store.items():
-            if section.startswith("_"):  # Skip metadata
-                continue
+        if self.shards is not None:
+            return self.shards.search(
+                input_vector, site=site, top_n=top_n, threshold=threshold,
+                top_sections=self.top_sections, routing_margin=self.routing_margin, full_scan=full_scan,
+                link_weight=self.link_weight
+            )
+        # Take one snapshot so a concurrent swap cannot mix two index versions
+        return rank_chunks(
+            input_vector, self._index, top_n=top_n, threshold=threshold,
+            top_sections=self.top_sections, routing_margin=self.routing_margin, full_scan=full_scan,
+            link_weight=self.link_weight
+        )
+
+    def _find_chunks(self, input_text, top_n=3, threshold=0.3, site=None):
+        """
+        Encodes a query and ranks the chunks that match it.
 
-            section_embeddings = section_data["embeddings"]
-            section_chunks = section_data["chunks"]
+        Returns:
+            list: (score, section, chunk_index, chunk_text) tuples, best first.
+        """
+        with metrics.span("query_encode"):
+            input_vector = self.vectorizer.encode(input_text, convert_to_tensor=True)
+        with metrics.span("similarity_scan"):
+            return self._rank_chunks(input_vector, top_n=top_n, threshold=threshold, site=site)
 
-            if not section_chunks:
-                continue
+    def _find_best_chunk(self, input_text, top_n=3, threshold=0.3, site=None):
+        """
+        Identify the most relevant chunk for the input query using cosine similarity.
 
-            # Compute similarity
-            cosine_scores = torch.nn.functional.cosine_similarity(input_vector, section_embeddings, dim=-1)
-            top_indices = torch.topk(cosine_scores, k=top_n).indices
+        Args:
+            input_text (str): User's input query.
+            top_n (int): Number of top chunks to evaluate.
+            threshold (float): Minimum similarity score.
+            site (str): Shard to search when serving a ShardedIndex (optional).
 
-            for index in top_indices:
-                score = cosine_scores[index].item()
-                if score >= threshold:
-                    matching_chunks.append(section_chunks[index])
-                    similarity_scores.append(score)
+        Returns:
+            str: The best matching chunk text or fallback message if none is found.
+        """
+        ranked = self._find_chunks(input_text, top_n=top_n, threshold=threshold, site=site)
 
-        if not matching_chunks:
+        if not ranked:
             return "No matching context found."
 
         # Select the highest scoring chunk
-        best_match_idx = np.argmax(similarity_scores)
-        return matching_chunks[best_match_idx]
+        return ranked[0][3]
 
     def _use_huggingface_api(self, prompt, max_tokens=150):
         """
@@ -138,7 +428,7 @@ class AIChatAssistant:
         if not self.api_key:
             return "Hugging Face API key is missing. Please set it up to proceed."
 
-        endpoint = f"https://api-inference.huggingface.co/models/{self.model_id}"
+        endpoint = f"{self.api_url}/{self.model_id}"
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
@@ -154,7 +444,9 @@ class AIChatAssistant:
         }
 
         response = requests.post(endpoint, headers=headers, json=payload)
+        metrics.inc("api_requests_total")
         if response.status_code != 200:
+            metrics.inc("api_errors_total")
             return f"API Error {response.status_code}: {response.text}"
 
         try:
@@ -162,6 +454,7 @@ class AIChatAssistant:
             # Extract the generated text
             return output[0].get("generated_text", "").strip()
         except Exception as err:
+            metrics.inc("api_errors_total")
             return f"Error in API response parsing: {err}"
 
 if __name__ == "__main__":
@@ -0,0 +1,180 @@
+# context_packer.py
+
+import functools
+import re
+
+import metrics
+
+# Input limit of google/flan-t5-base; longer prompts are cut by the server
+DEFAULT_MAX_INPUT_TOKENS = 512
+
+# Used only when the tokenizer cannot be loaded; errs high so prompts still fit
+_TOKENS_PER_WORD_ESTIMATE = 1.5
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+@functools.lru_cache(maxsize=None)
+def load_tokenizer(model_id):
+    """
+    Loads the generation model's tokenizer once per process.
+
+    Returns:
+        The tokenizer, or None if it cannot be loaded (token counts are then estimated).
+    """
+    try:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(model_id)
+        # Counting long chunks is fine; only the packed prompt has to fit the limit
+        tokenizer.model_max_length = int(1e9)
+        return tokenizer
+    except Exception as err:
+        print(f"Could not load the tokenizer for {model_id} ({err}); estimating token counts from words.")
+        return None
+
+
+def split_sentences(text):
+    return [sentence for sentence in _SENTENCE_END.split(text.strip()) if sentence]
+
+
+def _normalize(text):
+    return ' '.join(text.lower().split())
+
+
+class ContextPacker:
+    def __init__(self, model_id="google/flan-t5-base", max_input_tokens=None, max_chunks=5, cache_size=50000):
+        """
+        Fills a prompt's input token budget with retrieved chunks.
+
+        Chunks are taken highest score first. Repeated chunks and sentences
+        are skipped, and a chunk that does not fit whole is cut at the last
+        sentence that does. Token counts come from the model's own tokenizer
+        and are cached, since the same chunks come back for many queries.
+
+        Args:
+            model_id (str): Generation model whose tokenizer and input limit apply.
+            max_input_tokens (int): Token budget for the whole prompt (defaults to 512).
+            max_chunks (int): Most chunks packed into one prompt.
+            cache_size (int): Texts whose token counts are kept.
+        """
+        self.model_id = model_id
+        self.max_input_tokens = max_input_tokens or DEFAULT_MAX_INPUT_TOKENS
+        self.max_chunks = max_chunks
+        self.tokenizer = load_tokenizer(model_id)
+        self._cached_count = functools.lru_cache(maxsize=cache_size)(self._count)
+
+    def _count(self, text, special_tokens=False):
+        if self.tokenizer is None:
+            return int(len(text.split()) * _TOKENS_PER_WORD_ESTIMATE) + (1 if special_tokens else 0)
+        return len(self.tokenizer.encode(text, add_special_tokens=special_tokens))
+
+    def count_tokens(self, text):
+        """
+        Tokens in a piece of text, without special tokens.
+        """
+        return self._cached_count(text)
+
+    def count_prompt_tokens(self, prompt):
+        """
+        Tokens the model receives for a full prompt, including special tokens.
+        """
+        return self._count(prompt, special_tokens=True)
+
+    def pack(self, ranked, prompt_template, query):
+        """
+        Builds the largest prompt that fits the model's input limit.
+
+        Args:
+            ranked (list): (score, section, chunk_index, chunk_text) tuples, best first.
+            prompt_template (str): Prompt with {context} and {query} placeholders.
+            query (str): The user's question.
+
+        Returns:
+            tuple: The prompt and a stats dict (tokens sent, context tokens, budget, chunks
+                packed and trimmed, and whether the query had to be cut to fit).
+        """
+        overhead = self.count_prompt_tokens(prompt_template.format(context="", query=query))
+        query_truncated = overhead > self.max_input_tokens
+        if query_truncated:
+            # The question alone is over the limit; keep its start so the prompt still fits
+            template_tokens = self.count_prompt_tokens(prompt_template.format(context="", query=""))
+            query = self._truncate_words(query, self.max_input_tokens - template_tokens)
+            overhead = self.count_prompt_tokens(prompt_template.format(context="", query=query))
+            while overhead > self.max_input_tokens and query:
+                query = ' '.join(query.split()[:-1])
+                overhead = self.count_prompt_tokens(prompt_template.format(context="", query=query))
+        budget = self.max_input_tokens - overhead
+        separator_tokens = self.count_tokens(" ")
+
+        packed, seen_chunks, seen_sentences = [], set(), set()
+        used, trimmed, offered = 0, 0, 0
+        for _, _, _, chunk in ranked:
+            if len(packed) >= self.max_chunks or budget - used <= separator_tokens:
+                break
+            key = _normalize(chunk)
+            if key in seen_chunks:
+                continue
+            seen_chunks.add(key)
+            offered += self.count_tokens(chunk)
+
+            chunk_sentences, chunk_cut = [], False
+            for sentence in split_sentences(chunk):
+                sentence_key = _normalize(sentence)
+                if sentence_key in seen_sentences:
+                    continue
+                cost = self.count_tokens(sentence) + separator_tokens
+                if used + cost > budget:
+                    chunk_cut = True
+                    break
+                seen_sentences.add(sentence_key)
+                chunk_sentences.append(sentence)
+                used += cost
+            if chunk_sentences:
+                packed.append(' '.join(chunk_sentences))
+                trimmed += chunk_cut
+
+        if not packed and ranked:
+            # Even the first sentence is over budget; fall back to cutting it at a word
+            cut = self._truncate_words(ranked[0][3], budget)
+            if cut:
+                packed.append(cut)
+
+        prompt = prompt_template.format(context=' '.join(packed), query=query)
+        sent = self.count_prompt_tokens(prompt)
+        # Counting pieces separately can be off by a token or two at the joins
+        while sent > self.max_input_tokens and packed:
+            sentences = split_sentences(packed[-1])
+            if len(sentences) > 1:
+                packed[-1] = ' '.join(sentences[:-1])
+            else:
+                packed.pop()
+            prompt = prompt_template.format(context=' '.join(packed), query=query)
+            sent = self.count_prompt_tokens(prompt)
+
+        stats = {
+            'tokens_sent': sent,
+            'context_tokens': sent - overhead if packed else 0,
+            'token_budget': self.max_input_tokens,
+            'context_tokens_offered': offered,
+            'chunks_packed': len(packed),
+            'chunks_trimmed': trimmed,
+            'query_truncated': query_truncated,
+        }
+        metrics.inc("prompt_tokens_sent_total", stats['tokens_sent'])
+        metrics.inc("prompt_context_tokens_total", stats['context_tokens'])
+        metrics.inc("prompt_tokens_unused_budget_total", self.max_input_tokens - stats['tokens_sent'])
+        metrics.inc("context_chunks_packed_total", stats['chunks_packed'])
+        if query_truncated:
+            metrics.inc("prompt_queries_truncated_total")
+        return prompt, stats
+
+    def _truncate_words(self, text, budget):
+        words = text.split()
+        low, high = 0, len(words)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self._count(' '.join(words[:middle])) <= budget:
+                low = middle
+            else:
+                high = middle - 1
+        return ' '.join(words[:low])
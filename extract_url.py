@@ -1,6 +1,11 @@
+import json
+import os
+import pickle
+import zlib
 import requests
+import xml.etree.ElementTree as ET
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlparse
 
 def extract_all_urls(base_url):
     """
@@ -38,9 +43,235 @@ def extract_all_urls(base_url):
         print(f"Error fetching {base_url}: {e}")
         return []
 
+def load_site_urls(sites_file="sites.json", site=None):
+    """
+    Reads the {site: {label: url}} mapping of the sites to index.
+
+    Args:
+        sites_file (str): JSON file, e.g. {"BotPenguin": {"Homepage": "https://botpenguin.com/", ...}}.
+        site (str): Return only this site's pages; None merges every site.
+
+    Returns:
+        dict: Section labels mapped to URLs. Merged labels are prefixed with their
+        site, e.g. "BotPenguin - Homepage", since sites often share labels.
+
+    Raises:
+        ValueError: If `site` is not listed in the file.
+    """
+    with open(sites_file, 'r', encoding='utf-8') as file:
+        sites = json.load(file)
+    if site is not None:
+        if site not in sites:
+            raise ValueError(f"Site '{site}' is not in {sites_file}; choose one of: {', '.join(sites)}.")
+        return dict(sites[site])
+    return {f"{name} - {label}": url for name, urls in sites.items() for label, url in urls.items()}
+
+def find_sitemaps(base_url):
+    """
+    Reads the site's robots.txt and returns the sitemaps it declares.
+
+    Args:
+        base_url (str): Any URL on the website.
+
+    Returns:
+        list: Sitemap URLs, falling back to /sitemap.xml when robots.txt lists none.
+    """
+    parsed = urlparse(base_url)
+    site_root = f"{parsed.scheme}://{parsed.netloc}/"
+    sitemaps = []
+    try:
+        response = requests.get(urljoin(site_root, "robots.txt"), timeout=10)
+        if response.status_code == 200:
+            for line in response.text.splitlines():
+                # Directive names are case-insensitive, e.g. "Sitemap:" or "sitemap:"
+                key, _, value = line.partition(':')
+                if key.strip().lower() == 'sitemap' and value.strip():
+                    sitemaps.append(value.strip())
+    except requests.RequestException as e:
+        print(f"Error fetching robots.txt for {site_root}: {e}")
+
+    if not sitemaps:
+        sitemaps.append(urljoin(site_root, "sitemap.xml"))
+    return sitemaps
+
+def _local_name(tag):
+    """
+    Strips the XML namespace from an element tag, e.g. '{ns}loc' -> 'loc'.
+    """
+    return tag.rsplit('}', 1)[-1]
+
+def iter_sitemap_entries(sitemap_url, _seen=None):
+    """
+    Streams (url, lastmod) pairs from a sitemap, following sitemap indexes.
+
+    The response body is parsed incrementally and each <url> element is
+    discarded once read, so memory stays flat even for 50k-entry sitemaps.
+    Gzipped sitemaps (*.xml.gz) are decompressed on the fly.
+
+    Args:
+        sitemap_url (str): URL of a sitemap or sitemap index.
+
+    Yields:
+        tuple: The page URL and its <lastmod> value (None when absent).
+    """
+    seen = _seen if _seen is not None else set()
+    if sitemap_url in seen:
+        return
+    seen.add(sitemap_url)
+
+    try:
+        response = requests.get(sitemap_url, timeout=10, stream=True)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        print(f"Error fetching sitemap {sitemap_url}: {e}")
+        return
+
+    # iter_content undoes any Content-Encoding; *.xml.gz bodies are inflated here
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    inflater = None
+    child_sitemaps = []
+    root = None
+    loc = lastmod = None
+    try:
+        for block in response.iter_content(chunk_size=64 * 1024):
+            if inflater is None:
+                inflater = zlib.decompressobj(16 + zlib.MAX_WBITS) if block[:2] == b'\x1f\x8b' else False
+            parser.feed(inflater.decompress(block) if inflater else block)
+            for event, element in parser.read_events():
+                if root is None:
+                    root = element
+                if event == 'start':
+                    continue
+                name = _local_name(element.tag)
+                # Only the entry's own <loc>/<lastmod>; extensions like <image:loc> come later
+                if name == 'loc' and loc is None:
+                    loc = (element.text or '').strip()
+                elif name == 'lastmod' and lastmod is None:
+                    lastmod = (element.text or '').strip() or None
+                elif name in ('url', 'sitemap'):
+                    if loc:
+                        if name == 'sitemap':
+                            child_sitemaps.append(loc)
+                        else:
+                            yield loc, lastmod
+                    loc = lastmod = None
+                    # Drop finished entries so the tree never grows
+                    root.clear()
+        parser.close()
+    except (ET.ParseError, zlib.error, requests.RequestException) as e:
+        print(f"Error parsing sitemap {sitemap_url}: {e}")
+    finally:
+        response.close()
+
+    for child_url in child_sitemaps:
+        yield from iter_sitemap_entries(child_url, seen)
+
+def load_lastmod_state(state_file):
+    """
+    Loads the {url: lastmod} mapping recorded by the previous build.
+    """
+    if not state_file or not os.path.exists(state_file):
+        return {}
+    with open(state_file, 'rb') as file:
+        return pickle.load(file)
+
+def save_lastmod_state(state, state_file):
+    """
+    Saves the {url: lastmod} mapping for the next build to compare against.
+    """
+    with open(state_file, 'wb') as file:
+        pickle.dump(state, file)
+
+def extract_sitemap_urls(base_url, previous_state=None, same_host=True):
+    """
+    Discovers the site's URLs from its sitemaps and detects which ones changed.
+
+    A page is reported as changed when it is new, has no <lastmod>, or its
+    <lastmod> differs from the value recorded by the previous build. Nothing
+    is saved here; the caller stores the returned state once its crawl has
+    succeeded, so a failed crawl does not mark pages as seen.
+
+    Args:
+        base_url (str): The URL of the website.
+        previous_state (dict): {url: lastmod} recorded by the previous build (optional).
+        same_host (bool): Ignore sitemap entries that point to other hosts.
+
+    Returns:
+        tuple: All discovered URLs, the changed ones, and the {url: lastmod} state to save.
+    """
+    previous_state = previous_state or {}
+    host = urlparse(base_url).netloc
+    seen = set()
+    current_state = {}
+    changed_urls = []
+
+    for sitemap_url in find_sitemaps(base_url):
+        for url, lastmod in iter_sitemap_entries(sitemap_url, seen):
+            if same_host and urlparse(url).netloc != host:
+                continue
+            if url in current_state:
+                continue
+            current_state[url] = lastmod
+            if lastmod is None or previous_state.get(url) != lastmod:
+                changed_urls.append(url)
+
+    return list(current_state), changed_urls, current_state
+
+def url_label(url):
+    """
+    Builds a readable section label from a URL path, e.g. '/chatbot-pricing' -> 'Chatbot Pricing'.
+    """
+    path = urlparse(url).path.strip('/')
+    if not path:
+        return "Homepage"
+    return ' - '.join(part.replace('-', ' ').replace('_', ' ').title() for part in path.split('/'))
+
+def discover_site_urls(base_url, mode="sitemap", previous_state=None):
+    """
+    Builds the {label: url} mapping used to seed the scrapers.
+
+    Args:
+        base_url (str): The URL of the website.
+        mode (str): "sitemap" to read the site's sitemaps, "html" to parse links from the page.
+            Sitemap mode falls back to HTML parsing when the site publishes no sitemap.
+        previous_state (dict): {url: lastmod} saved by the previous build (sitemap mode only).
+
+    Returns:
+        tuple: Section labels mapped to URLs, ready for extract_and_store; the labels of
+        pages that changed since the previous build (all of them in HTML mode); and the
+        {url: lastmod} state to save once the build succeeds.
+    """
+    urls, changed_urls, lastmod_state = [], [], {}
+    if mode == "sitemap":
+        urls, changed_urls, lastmod_state = extract_sitemap_urls(base_url, previous_state=previous_state)
+        if not urls:
+            print(f"No sitemap entries found for {base_url}, falling back to HTML link discovery.")
+            mode = "html"
+    if mode == "html":
+        urls = extract_all_urls(base_url)
+        changed_urls = urls
+
+    site_urls = {}
+    for url in urls:
+        label = url_label(url)
+        # Keep labels unique when two paths normalize to the same text
+        if label in site_urls:
+            label = f"{label} ({url})"
+        site_urls[label] = url
+
+    changed = set(changed_urls)
+    changed_labels = {label for label, url in site_urls.items() if url in changed}
+    return site_urls, changed_labels, lastmod_state
+
 if __name__ == "__main__":
     website_url = "https://botpenguin.com/"
-    urls = extract_all_urls(website_url)
-    print(f"Found {len(urls)} URLs:")
-    for url in urls:
-        print(url)
+    all_urls, changed_urls, _ = extract_sitemap_urls(website_url, previous_state=load_lastmod_state("sitemap_state.pkl"))
+    if all_urls:
+        print(f"Found {len(all_urls)} URLs in sitemaps, {len(changed_urls)} changed since the last build:")
+        for url in changed_urls:
+            print(url)
+    else:
+        urls = extract_all_urls(website_url)
+        print(f"Found {len(urls)} URLs:")
+        for url in urls:
+            print(url)
@@ -0,0 +1,524 @@
+# index_manager.py
+
+import inspect
+import json
+import os
+import pickle
+import shutil
+import threading
+from datetime import datetime, timezone
+
+from answer_table import build_answer_table
+from extract_url import discover_site_urls, load_lastmod_state, save_lastmod_state
+from query_log import load_query_log
+from link_graph import normalize_url
+from scraper_mod import extract_and_store
+from text_processing import prepare_data
+
+
+def _url_key(url):
+    # 'https://site.com/plans/' and 'https://site.com/plans#faq' are the same page as 'https://site.com/plans'
+    return normalize_url(url).rstrip('/')
+
+
+def merge_discovered_urls(site_urls, discovered, changed_labels):
+    """
+    Adds pages found in the sitemap to the explicitly listed ones, one section per page.
+
+    A page listed both ways keeps its explicit label, so it is fetched and
+    indexed once, and its sitemap <lastmod> still decides whether it changed.
+
+    Args:
+        site_urls (dict): Explicitly listed section labels and their URLs.
+        discovered (dict): Labels and URLs from discover_site_urls.
+        changed_labels (set): Discovered labels whose pages changed since the last build.
+
+    Returns:
+        tuple: The merged {label: url}; {label: sitemap URL} for merged pages found
+        in the sitemap; and the merged labels of the changed pages.
+    """
+    merged = dict(site_urls)
+    labels_by_url = {_url_key(url): label for label, url in site_urls.items()}
+    sitemap_urls, changed = {}, set()
+    for discovered_label, url in discovered.items():
+        label = labels_by_url.get(_url_key(url))
+        if label is None:
+            label = discovered_label if discovered_label not in merged else f"{discovered_label} ({url})"
+            merged[label] = url
+        sitemap_urls[label] = url
+        if discovered_label in changed_labels:
+            changed.add(label)
+    return merged, sitemap_urls, changed
+
+
+def _atomic_write(path, data, mode='wb'):
+    """
+    Writes a file so readers only ever see the old or the complete new contents.
+    """
+    temp_path = f"{path}.tmp"
+    with open(temp_path, mode) as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+
+class IndexManager:
+    def __init__(self, root_dir="index", keep_versions=3):
+        """
+        Versioned on-disk store for processed data, with atomic promotion and rollback.
+
+        Layout:
+            <root_dir>/versions/<version>/extracted_data.pkl
+            <root_dir>/versions/<version>/processed_data.pkl
+            <root_dir>/versions/<version>/link_graph.pkl     crawl link graph (optional)
+            <root_dir>/versions/<version>/answer_table.pkl   pre-generated answers (optional)
+            <root_dir>/versions/<version>/sitemap_state.pkl  sitemap lastmod values seen by the build (optional)
+            <root_dir>/CURRENT        name of the live version
+            <root_dir>/history.json   promoted versions, oldest first
+
+        Args:
+            root_dir (str): Directory holding all index versions.
+            keep_versions (int): Number of promoted versions kept on disk for rollback.
+        """
+        self.root_dir = root_dir
+        self.versions_dir = os.path.join(root_dir, "versions")
+        self.keep_versions = max(2, keep_versions)
+        self._refresh_lock = threading.Lock()
+        os.makedirs(self.versions_dir, exist_ok=True)
+
+    def current_version(self):
+        """
+        Returns the live version name, or None before the first build.
+        """
+        try:
+            with open(os.path.join(self.root_dir, "CURRENT"), 'r', encoding='utf-8') as file:
+                return file.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def version_dir(self, version):
+        return os.path.join(self.versions_dir, version)
+
+    def _history(self):
+        try:
+            with open(os.path.join(self.root_dir, "history.json"), 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return []
+
+    def load(self, version=None):
+        """
+        Loads the processed data of a version (the live one by default).
+
+        Returns:
+            dict: Processed data, or None if there is no such version.
+        """
+        version = version or self.current_version()
+        if not version:
+            return None
+        processed_file = os.path.join(self.version_dir(version), "processed_data.pkl")
+        if not os.path.exists(processed_file):
+            return None
+        with open(processed_file, 'rb') as file:
+            return pickle.load(file)
+
+    def load_answer_table(self, version=None):
+        """
+        Loads the pre-generated answers of a version (the live one by default).
+
+        Returns:
+            dict: The answer table, or None if none was generated for that version.
+        """
+        version = version or self.current_version()
+        if not version:
+            return None
+        table_file = os.path.join(self.version_dir(version), "answer_table.pkl")
+        if not os.path.exists(table_file):
+            return None
+        with open(table_file, 'rb') as file:
+            return pickle.load(file)
+
+    def save_answer_table(self, answer_table):
+        """
+        Stores an answer table next to the index version it was generated from.
+        """
+        version = answer_table['_index_version']
+        _atomic_write(os.path.join(self.version_dir(version), "answer_table.pkl"), pickle.dumps(answer_table))
+
+    def regenerate_answer_table(self, assistant, **table_kwargs):
+        """
+        Re-answers the assistant's frequent logged questions against the index it now serves.
+
+        Until the new table is installed, the assistant's old table no longer
+        matches its index version, so those questions are answered live.
+
+        Args:
+            assistant (AIChatAssistant): Assistant with a query log.
+            **table_kwargs: Passed on to answer_table.build_answer_table (max_answers, ...).
+
+        Returns:
+            dict: The new answer table, or None if there is no query log to mine.
+        """
+        if assistant is None or assistant.query_log is None or assistant.shards is not None:
+            return None
+        queries = load_query_log(assistant.query_log.path)
+        if not queries:
+            return None
+        answer_table = build_answer_table(assistant, queries, **table_kwargs)
+        self.save_answer_table(answer_table)
+        assistant.set_answer_table(answer_table)
+        return answer_table
+
+    def load_link_graph(self, version=None):
+        """
+        Loads the crawl link graph of a version (the live one by default), or None.
+        """
+        version = version or self.current_version()
+        if not version:
+            return None
+        graph_file = os.path.join(self.version_dir(version), "link_graph.pkl")
+        if os.path.exists(graph_file):
+            with open(graph_file, 'rb') as file:
+                return pickle.load(file)
+        # Versions built before link_graph.pkl kept the graph inside the extracted data
+        return self._load_extracted(version).get('_link_graph')
+
+    def _load_extracted(self, version):
+        if not version:
+            return {}
+        extracted_file = os.path.join(self.version_dir(version), "extracted_data.pkl")
+        if not os.path.exists(extracted_file):
+            return {}
+        with open(extracted_file, 'rb') as file:
+            return pickle.load(file)
+
+    def build(self, site_urls=None, selector=None, archive_path=None, replay=False, page_budget=None,
+              base_url=None, changed_only=False, **prepare_kwargs):
+        """
+        Scrapes and processes a new index version next to the live one.
+
+        The version is not served until it is verified and promoted. Sections
+        that are not fetched this time (unchanged pages, pages over the budget,
+        failed fetches) keep their content from the live version, so a partial
+        crawl never shrinks the index. Their chunks and embeddings are reused
+        as well, so only fetched pages are embedded again.
+
+        Args:
+            site_urls (dict): Section labels and their URLs (optional with `base_url`).
+            selector (str): CSS selector for targeting specific content (optional).
+            archive_path (str): Page archive to record into or replay from (optional).
+            replay (bool): Rebuild from `archive_path` without network access.
+            page_budget (int): Maximum pages to fetch, most linked first in the live version's graph (optional).
+            base_url (str): Seed the crawl from this site's sitemap, adding to `site_urls` (optional).
+            changed_only (bool): With `base_url`, only fetch pages whose sitemap <lastmod>
+                changed since the live version was built.
+            **prepare_kwargs: Passed on to prepare_data (embedding_model, segment_size, ...).
+
+        Returns:
+            str: The new version name, or None if processing produced no data.
+        """
+        live_version = self.current_version()
+        previous_graph = self.load_link_graph()
+        site_urls = dict(site_urls or {})
+
+        previous_state, lastmod_state, sitemap_urls, changed_labels = {}, None, {}, None
+        if base_url:
+            if live_version:
+                previous_state = load_lastmod_state(os.path.join(self.version_dir(live_version), "sitemap_state.pkl"))
+            discovered, discovered_changed, lastmod_state = discover_site_urls(base_url, previous_state=previous_state)
+            site_urls, sitemap_urls, changed_labels = merge_discovered_urls(site_urls, discovered, discovered_changed)
+
+        live_extracted = self._load_extracted(live_version)
+        fetch_urls = site_urls
+        if changed_only and changed_labels is not None:
+            # Pages outside the sitemap have no lastmod to compare, so they are always fetched
+            fetch_urls = {
+                label: url for label, url in site_urls.items()
+                if label in changed_labels or label not in sitemap_urls
+                or live_extracted.get(label, {}).get('url') != url
+            }
+            print(f"{len(fetch_urls)} of {len(site_urls)} pages changed since the live version.")
+
+        version = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S-%f")
+        target_dir = self.version_dir(version)
+        os.makedirs(target_dir)
+
+        extracted_file = os.path.join(target_dir, "extracted_data.pkl")
+        extract_and_store(
+            fetch_urls, extracted_file, selector, archive_path=archive_path, replay=replay,
+            previous_graph=previous_graph, page_budget=page_budget
+        )
+        with open(extracted_file, 'rb') as file:
+            extracted_data = pickle.load(file)
+
+        carried = self._carry_over(extracted_data, site_urls, live_extracted, previous_graph)
+        if carried:
+            print(f"Kept {len(carried)} unfetched sections from version {live_version}.")
+
+        # The graph gets its own file so the next build can read it without the page text
+        link_graph = extracted_data.get('_link_graph')
+        if link_graph is not None:
+            _atomic_write(os.path.join(target_dir, "link_graph.pkl"), pickle.dumps(link_graph))
+        if carried or link_graph is not None:
+            sections = {label: data for label, data in extracted_data.items() if label != '_link_graph'}
+            _atomic_write(extracted_file, pickle.dumps(sections))
+
+        processed_data = self._process(extracted_data, carried, self.load(live_version) if carried else None, prepare_kwargs)
+        if not processed_data:
+            shutil.rmtree(target_dir, ignore_errors=True)
+            return None
+
+        if lastmod_state:
+            # A page that was due but not fetched keeps its old lastmod, so the next build retries it
+            for label in fetch_urls:
+                url = sitemap_urls.get(label)
+                if url is None or (label in extracted_data and label not in carried):
+                    continue
+                if url in previous_state:
+                    lastmod_state[url] = previous_state[url]
+                else:
+                    lastmod_state.pop(url, None)
+            save_lastmod_state(lastmod_state, os.path.join(target_dir, "sitemap_state.pkl"))
+
+        processed_data['_index_version'] = version
+        _atomic_write(os.path.join(target_dir, "processed_data.pkl"), pickle.dumps(processed_data))
+        print(f"Built index version {version}.")
+        return version
+
+    @staticmethod
+    def _carry_over(extracted_data, site_urls, live_extracted, previous_graph):
+        """
+        Copies sections that were not fetched in this build from the live version's extracted data.
+
+        Returns:
+            set: Labels of the sections carried over.
+        """
+        link_graph = extracted_data.get('_link_graph')
+        carried = set()
+        for label, url in site_urls.items():
+            if label in extracted_data or label not in live_extracted:
+                continue
+            section = live_extracted[label]
+            if section.get('url', url) != url:
+                continue
+            extracted_data[label] = section
+            if link_graph is not None and previous_graph is not None and url in previous_graph:
+                link_graph.add_page(url, previous_graph.out_links(url))
+            carried.add(label)
+        return carried
+
+    @staticmethod
+    def _process(extracted_data, carried, live_processed, prepare_kwargs):
+        """
+        Runs prepare_data on the fetched sections and reuses the live version's processed carried ones.
+
+        Carried sections are reused only if the live version was embedded and chunked
+        with the same settings; their link priors are recomputed from the new graph.
+
+        Returns:
+            dict: Processed data, or None if there is none.
+        """
+        settings = {
+            name: prepare_kwargs.get(name, parameter.default)
+            for name, parameter in inspect.signature(prepare_data).parameters.items()
+            if name in ('embedding_model', 'segment_size', 'min_words', 'sub_centroids')
+        }
+        embedding_model = settings.pop('embedding_model')
+        reusable = (
+            live_processed is not None
+            and live_processed.get('_embedding_model') == embedding_model
+            and live_processed.get('_chunking') == settings
+        )
+        if not reusable:
+            return prepare_data(scraped_content=extracted_data, **prepare_kwargs)
+
+        fetched = {label: data for label, data in extracted_data.items() if label not in carried}
+        processed_data = prepare_data(scraped_content=fetched, **prepare_kwargs) if fetched else None
+        if processed_data is None:
+            processed_data = {'_embedding_model': embedding_model, '_chunking': settings}
+
+        link_graph = extracted_data.get('_link_graph')
+        link_priors = link_graph.link_priors() if link_graph is not None else {}
+        reused = 0
+        for label in carried:
+            # A carried page the live version had no valid chunks for would produce none again
+            if label not in live_processed:
+                continue
+            section = dict(live_processed[label])
+            url = section.get('url')
+            section['link_prior'] = link_priors.get(normalize_url(url), 0.0) if url else 0.0
+            processed_data[label] = section
+            reused += 1
+        fetched_sections = sum(not label.startswith('_') for label in fetched)
+        print(f"Reused the embeddings of {reused} unfetched sections; processed {fetched_sections} fetched ones.")
+        return processed_data
+
+    @staticmethod
+    def verify(processed_data, embedding_model=None):
+        """
+        Checks that processed data is complete enough to serve.
+
+        Args:
+            processed_data (dict): Candidate processed data.
+            embedding_model (str): Embedding model the serving assistant uses (optional).
+
+        Returns:
+            tuple: (ok, reason) where reason explains a failed check.
+        """
+        if not processed_data:
+            return False, "no processed data"
+        if embedding_model and processed_data.get('_embedding_model') != embedding_model:
+            return False, (
+                f"embedding model {processed_data.get('_embedding_model')} "
+                f"does not match the serving model {embedding_model}"
+            )
+
+        dims = set()
+        sections = 0
+        for section_name, section_data in processed_data.items():
+            if section_name.startswith('_'):
+                continue
+            chunks = section_data.get('chunks')
+            embeddings = section_data.get('embeddings')
+            if not chunks or embeddings is None:
+                return False, f"section '{section_name}' has no chunks or embeddings"
+            if embeddings.shape[0] != len(chunks):
+                return False, f"section '{section_name}' has {len(chunks)} chunks but {embeddings.shape[0]} embeddings"
+            dims.add(embeddings.shape[-1])
+            sections += 1
+
+        if not sections:
+            return False, "no sections"
+        if len(dims) > 1:
+            return False, f"mixed embedding dimensions {sorted(dims)}"
+        return True, "ok"
+
+    def promote(self, version):
+        """
+        Atomically makes a built version the live one and prunes old versions.
+        """
+        history = [entry for entry in self._history() if entry != version] + [version]
+        _atomic_write(os.path.join(self.root_dir, "history.json"), json.dumps(history), mode='w')
+        _atomic_write(os.path.join(self.root_dir, "CURRENT"), version, mode='w')
+        self._prune(history)
+
+    def _prune(self, history):
+        """
+        Deletes version directories that are neither recent promotions nor in progress.
+        """
+        keep = set(history[-self.keep_versions:])
+        for version in os.listdir(self.versions_dir):
+            if version in keep:
+                continue
+            # Unpromoted versions newer than the live one may still be building
+            if version not in history and version > history[-1]:
+                continue
+            shutil.rmtree(self.version_dir(version), ignore_errors=True)
+
+    def refresh(self, assistant=None, site_urls=None, **build_kwargs):
+        """
+        Builds, verifies and promotes a new version, then hot-swaps it into the assistant.
+
+        The assistant keeps answering from the old version until the swap, which
+        is a single reference assignment. Only one refresh runs at a time. If
+        the assistant logs queries, its answer table is then regenerated for
+        the new version; a failure there does not fail the refresh.
+
+        Args:
+            assistant (AIChatAssistant): Running assistant to swap the new data into (optional).
+            site_urls (dict): Section labels and their URLs.
+            **build_kwargs: Passed on to build().
+
+        Returns:
+            str: The promoted version, or None if the refresh was skipped or failed.
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            print("An index refresh is already running.")
+            return None
+        try:
+            version = self.build(site_urls, **build_kwargs)
+            if not version:
+                print("Index refresh produced no data; keeping the live version.")
+                return None
+
+            processed_data = self.load(version)
+            serving_model = assistant.data_store.get('_embedding_model') if assistant else None
+            ok, reason = self.verify(processed_data, serving_model)
+            if not ok:
+                print(f"Index version {version} failed verification ({reason}); keeping the live version.")
+                shutil.rmtree(self.version_dir(version), ignore_errors=True)
+                return None
+
+            # Promote first: the assistant must never serve a version that is not recorded as live
+            self.promote(version)
+            if assistant is not None:
+                assistant.swap_data_store(processed_data)
+            print(f"Index version {version} is now live.")
+        except Exception as error:
+            print(f"Index refresh failed: {error}")
+            return None
+        else:
+            # The new version is live either way; a stale table is simply not used for it
+            try:
+                self.regenerate_answer_table(assistant)
+            except Exception as error:
+                print(f"Answer table regeneration for index version {version} failed: {error}")
+            return version
+        finally:
+            self._refresh_lock.release()
+
+    def start_background_refresh(self, assistant, site_urls, **build_kwargs):
+        """
+        Runs refresh() on a daemon thread so the assistant keeps serving meanwhile.
+
+        Returns:
+            threading.Thread: The started refresh thread.
+        """
+        thread = threading.Thread(
+            target=self.refresh,
+            kwargs=dict(assistant=assistant, site_urls=site_urls, **build_kwargs),
+            name="index-refresh",
+            daemon=True
+        )
+        thread.start()
+        return thread
+
+    def rollback(self, assistant=None):
+        """
+        Switches back to the previously promoted version.
+
+        Shares the refresh lock, so it cannot interleave with a running refresh.
+
+        Returns:
+            str: The version now live, or None if there is nothing to roll back to
+            or a refresh is running.
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            print("An index refresh is running; roll back after it finishes.")
+            return None
+        try:
+            history = self._history()
+            if len(history) < 2:
+                print("No earlier index version to roll back to.")
+                return None
+
+            previous = history[-2]
+            processed_data = self.load(previous)
+            # Checked before CURRENT moves, so a version the assistant cannot serve never becomes live
+            serving_model = assistant.data_store.get('_embedding_model') if assistant else None
+            ok, reason = self.verify(processed_data, serving_model)
+            if not ok:
+                print(f"Cannot roll back to {previous}: {reason}.")
+                return None
+
+            # Drop the rolled-back version from history so a second rollback goes further back
+            _atomic_write(os.path.join(self.root_dir, "history.json"), json.dumps(history[:-1]), mode='w')
+            _atomic_write(os.path.join(self.root_dir, "CURRENT"), previous, mode='w')
+            if assistant is not None:
+                assistant.swap_data_store(processed_data)
+                assistant.set_answer_table(self.load_answer_table(previous))
+            print(f"Rolled back to index version {previous}.")
+            return previous
+        finally:
+            self._refresh_lock.release()
@@ -0,0 +1,246 @@
+# link_graph.py
+
+import math
+import pickle
+import sys
+from array import array
+from urllib.parse import urldefrag, urlparse
+
+import numpy as np
+
+
+def normalize_url(url):
+    """
+    Drops the fragment so '/pricing#faq' and '/pricing' are one page.
+    """
+    return urldefrag(url.strip())[0]
+
+
+class LinkGraph:
+    def __init__(self):
+        """
+        Link graph of a crawl with interned URLs and CSR adjacency.
+
+        Every URL is stored once and referred to by an integer id. The
+        outgoing links of page `i` are `targets[offsets[i]:offsets[i + 1]]`,
+        packed into two flat arrays instead of one dict of strings per page.
+        Pages added since the last compaction are kept aside and merged into
+        the arrays on the next read.
+        """
+        self.urls = []        # id -> URL
+        self._ids = {}        # URL -> id
+        self._offsets = array('Q', [0])
+        self._targets = array('I')
+        self._pending = {}    # page id -> array of target ids, not yet compacted
+
+    def intern(self, url):
+        """
+        Returns the id of a URL, assigning the next free one on first sight.
+        """
+        url = normalize_url(url)
+        node = self._ids.get(url)
+        if node is None:
+            node = self._ids[url] = len(self.urls)
+            self.urls.append(url)
+        return node
+
+    def add_page(self, url, links):
+        """
+        Records a crawled page and its outgoing links, replacing any earlier record of it.
+
+        Args:
+            url (str): The page URL.
+            links (iterable): Absolute URLs the page links to, e.g. fetch_links(...).values().
+
+        Returns:
+            int: The page id.
+        """
+        source = self.intern(url)
+        self._pending[source] = array('I', sorted({self.intern(link) for link in links} - {source}))
+        return source
+
+    def _compact(self):
+        if not self._pending:
+            return
+        compacted_nodes = len(self._offsets) - 1
+        offsets, targets = array('Q', [0]), array('I')
+        for node in range(len(self.urls)):
+            row = self._pending.get(node)
+            if row is None and node < compacted_nodes:
+                row = self._targets[self._offsets[node]:self._offsets[node + 1]]
+            if row:
+                targets.extend(row)
+            offsets.append(len(targets))
+        self._offsets, self._targets, self._pending = offsets, targets, {}
+
+    def __len__(self):
+        return len(self.urls)
+
+    def __contains__(self, url):
+        return normalize_url(url) in self._ids
+
+    @property
+    def num_edges(self):
+        self._compact()
+        return len(self._targets)
+
+    def out_links(self, url):
+        """
+        URLs a page links to (empty for pages that were only linked to, never crawled).
+        """
+        node = self._ids.get(normalize_url(url))
+        if node is None:
+            return []
+        self._compact()
+        if node >= len(self._offsets) - 1:
+            return []
+        return [self.urls[target] for target in self._targets[self._offsets[node]:self._offsets[node + 1]]]
+
+    def in_degrees(self):
+        """
+        Number of crawled pages linking to each URL, indexed by id.
+        """
+        self._compact()
+        targets = np.frombuffer(self._targets, dtype=np.uint32) if self._targets else np.zeros(0, dtype=np.uint32)
+        return np.bincount(targets, minlength=len(self.urls))
+
+    def in_degree(self, url):
+        node = self._ids.get(normalize_url(url))
+        return 0 if node is None else int(self.in_degrees()[node])
+
+    def link_priors(self):
+        """
+        Link importance per URL in [0, 1]: log in-degree scaled by the most linked page.
+
+        Returns:
+            dict: URL -> prior, for URLs with at least one incoming link.
+        """
+        degrees = self.in_degrees()
+        if not len(degrees) or degrees.max() == 0:
+            return {}
+        scale = math.log1p(int(degrees.max()))
+        return {
+            self.urls[node]: math.log1p(int(degrees[node])) / scale
+            for node in np.flatnonzero(degrees)
+        }
+
+    def crawl_order(self, items, page_budget=None, key=None):
+        """
+        Orders pages so the most linked-to ones are fetched first.
+
+        Pages the graph has never seen, or that nothing links to, keep their
+        original relative order after the rest.
+
+        Args:
+            items (iterable): Candidate URLs, or items holding them (see `key`).
+            page_budget (int): Keep only this many (optional).
+            key (callable): Gets the URL from each item, like sorted()'s key (optional).
+
+        Returns:
+            list: Items, highest in-degree first.
+        """
+        degrees = self.in_degrees()
+
+        def degree(item):
+            node = self._ids.get(normalize_url(key(item) if key else item))
+            return 0 if node is None else int(degrees[node])
+
+        ordered = sorted(items, key=degree, reverse=True)
+        return ordered[:page_budget] if page_budget is not None else ordered
+
+    def memory_bytes(self):
+        """
+        Approximate memory held by the graph: URL strings, the id lookup and both arrays.
+        """
+        self._compact()
+        arrays = sum(len(values) * values.itemsize for values in (self._offsets, self._targets))
+        strings = sum(sys.getsizeof(url) for url in self.urls)
+        return arrays + strings + sys.getsizeof(self.urls) + sys.getsizeof(self._ids)
+
+    def __getstate__(self):
+        # The URL -> id lookup is rebuilt on load rather than pickled twice
+        self._compact()
+        return {'urls': self.urls, 'offsets': self._offsets, 'targets': self._targets}
+
+    def __setstate__(self, state):
+        self.urls = state['urls']
+        self._ids = {url: node for node, url in enumerate(self.urls)}
+        self._offsets = state['offsets']
+        self._targets = state['targets']
+        self._pending = {}
+
+
+def link_dicts_bytes(link_dicts):
+    """
+    Memory of per-page {href: absolute URL} dicts as returned by fetch_links/extract_links.
+
+    Args:
+        link_dicts (dict): Page URL -> links dict.
+    """
+    total = sys.getsizeof(link_dicts)
+    for links in link_dicts.values():
+        total += sys.getsizeof(links)
+        total += sum(sys.getsizeof(href) + sys.getsizeof(url) for href, url in links.items())
+    return total
+
+
+def memory_report(graph, link_dicts=None):
+    """
+    Compares the graph's memory per edge with the dict-of-strings representation.
+
+    Args:
+        graph (LinkGraph): The crawl's link graph.
+        link_dicts (dict): The original per-page link dicts. If omitted they are
+            rebuilt from the graph the way fetch_links creates them: relative
+            href keys and a fresh absolute URL string per link.
+
+    Returns:
+        dict: Nodes, edges, and total and per-edge bytes for both representations.
+    """
+    if link_dicts is None:
+        link_dicts = {}
+        for url in graph.urls:
+            links = graph.out_links(url)
+            if links:
+                # Decoding makes fresh string objects per page, as parsing every page does
+                link_dicts[url] = {
+                    (urlparse(link).path or link): link.encode('utf-8').decode('utf-8') for link in links
+                }
+
+    edges = graph.num_edges
+    graph_bytes = graph.memory_bytes()
+    dict_bytes = link_dicts_bytes(link_dicts)
+    return {
+        'nodes': len(graph),
+        'edges': edges,
+        'graph_bytes': graph_bytes,
+        'dict_bytes': dict_bytes,
+        'graph_bytes_per_edge': graph_bytes / edges if edges else 0.0,
+        'dict_bytes_per_edge': dict_bytes / edges if edges else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    """
+    Usage:
+        python link_graph.py index/versions/<version>/link_graph.pkl
+        python link_graph.py extracted_data.pkl
+    """
+    graph_file = sys.argv[1] if len(sys.argv) > 1 else "extracted_data.pkl"
+    with open(graph_file, "rb") as file:
+        loaded = pickle.load(file)
+
+    # Index versions store the graph alone; scraper output keeps it under '_link_graph'
+    link_graph = loaded if isinstance(loaded, LinkGraph) else loaded.get('_link_graph')
+    if link_graph is None:
+        raise SystemExit(f"{graph_file} has no link graph; rebuild it with scraper_mod.py or scraper_module.py.")
+
+    report = memory_report(link_graph)
+    print(f"{report['nodes']} URLs, {report['edges']} links")
+    print(f"Link graph:      {report['graph_bytes'] / 2**10:10.1f} KiB  {report['graph_bytes_per_edge']:7.1f} bytes/link")
+    print(f"Dict of strings: {report['dict_bytes'] / 2**10:10.1f} KiB  {report['dict_bytes_per_edge']:7.1f} bytes/link")
+
+    degrees = link_graph.in_degrees()
+    print("\nMost linked pages:")
+    for node in np.argsort(-degrees, kind='stable')[:10]:
+        print(f"{int(degrees[node]):6d}  {link_graph.urls[node]}")
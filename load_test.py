@@ -0,0 +1,234 @@
+# load_test.py
+
+import argparse
+import itertools
+import json
+import pickle
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from bench_fixtures import start_mock_inference
+from chatbot_module import AIChatAssistant, is_error_response
+from index_manager import IndexManager
+from query_log import load_query_log
+
+
+class InProcessTarget:
+    """
+    Sends queries straight to an AIChatAssistant in this process.
+    """
+    def __init__(self, assistant):
+        self.assistant = assistant
+
+    def __call__(self, query):
+        return not is_error_response(self.assistant.get_response(query))
+
+
+class HttpTarget:
+    """
+    Sends queries to a chat_server.py endpoint, one keep-alive session per thread.
+
+    chat_server answers failed generations with a 5xx status, so only 200 counts as success.
+    """
+    def __init__(self, url, timeout=60):
+        self.url = url
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def __call__(self, query):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        try:
+            response = session.post(self.url, json={"query": query}, timeout=self.timeout)
+            return response.status_code == 200
+        except requests.exceptions.RequestException:
+            return False
+
+
+def _summarize(latencies, errors, elapsed):
+    samples = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    completed = len(latencies)
+    return {
+        'completed': completed,
+        'errors': errors,
+        'elapsed_s': elapsed,
+        'throughput_per_s': completed / elapsed if elapsed else 0.0,
+        'p50_ms': float(np.percentile(samples, 50)),
+        'p95_ms': float(np.percentile(samples, 95)),
+        'p99_ms': float(np.percentile(samples, 99)),
+    }
+
+
+def run_closed_loop(target, queries, concurrency, duration):
+    """
+    Runs `concurrency` simulated users that each send their next query as soon
+    as the previous answer arrives.
+
+    Returns:
+        dict: Completed requests, errors, throughput and latency percentiles.
+    """
+    query_cycle = itertools.cycle(queries)
+    cycle_lock = threading.Lock()
+    latencies, errors = [], [0]
+    results_lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def user():
+        while time.perf_counter() < deadline:
+            with cycle_lock:
+                query = next(query_cycle)
+            start = time.perf_counter()
+            ok = target(query)
+            latency = time.perf_counter() - start
+            with results_lock:
+                if ok:
+                    latencies.append(latency)
+                else:
+                    errors[0] += 1
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=user, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return _summarize(latencies, errors[0], time.perf_counter() - start)
+
+
+def run_open_loop(target, queries, rate, duration, max_in_flight=1000, seed=0):
+    """
+    Sends queries with Poisson arrivals at `rate` per second, regardless of how
+    fast answers come back.
+
+    Latency is measured from each request's scheduled arrival time, so time
+    spent queued behind a saturated assistant is included.
+
+    Returns:
+        dict: Completed requests, errors, throughput and latency percentiles.
+    """
+    rng = random.Random(seed)
+    latencies, errors = [], [0]
+    results_lock = threading.Lock()
+
+    def send(query, scheduled):
+        ok = target(query)
+        latency = time.perf_counter() - scheduled
+        with results_lock:
+            if ok:
+                latencies.append(latency)
+            else:
+                errors[0] += 1
+
+    start = time.perf_counter()
+    scheduled = start
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        for query in itertools.cycle(queries):
+            scheduled += rng.expovariate(rate)
+            if scheduled - start >= duration:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, query, scheduled)
+    return _summarize(latencies, errors[0], time.perf_counter() - start)
+
+
+def find_saturation(results, level_key, growth=0.05, latency_factor=2.0):
+    """
+    Finds the highest load level before the assistant saturated.
+
+    Saturation is the first level where throughput grows by less than `growth`
+    over the previous level, or p95 latency exceeds `latency_factor` times the
+    p95 at the lightest level.
+
+    Returns:
+        The last healthy level, or None if every level looked healthy.
+    """
+    baseline_p95 = results[0]['p95_ms']
+    for previous, current in zip(results, results[1:]):
+        throughput_growth = current['throughput_per_s'] / previous['throughput_per_s'] - 1 if previous['throughput_per_s'] else 0
+        if throughput_growth < growth or current['p95_ms'] > latency_factor * baseline_p95:
+            return previous[level_key]
+    return None
+
+
+def sweep(target, queries, mode, levels, duration):
+    """
+    Runs the load test at each concurrency level (closed loop) or arrival rate (open loop).
+
+    Returns:
+        dict: Per-level results and the saturation point.
+    """
+    level_key = 'concurrency' if mode == 'closed' else 'rate'
+    results = []
+    for level in levels:
+        if mode == 'closed':
+            stats = run_closed_loop(target, queries, int(level), duration)
+        else:
+            stats = run_open_loop(target, queries, float(level), duration)
+        stats[level_key] = level
+        results.append(stats)
+        print(
+            f"{level_key} {level:>6}: {stats['throughput_per_s']:8.2f} req/s   p50 {stats['p50_ms']:8.1f} ms   "
+            f"p95 {stats['p95_ms']:8.1f} ms   p99 {stats['p99_ms']:8.1f} ms   errors {stats['errors']}"
+        )
+    return {'mode': mode, 'results': results, 'saturation': find_saturation(results, level_key)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the chat assistant with a replayed query log.")
+    parser.add_argument("--queries", required=True, help="Query log: one query per line, or JSON lines with 'query'.")
+    parser.add_argument("--mode", choices=("closed", "open"), default="closed",
+                        help="closed: fixed concurrent users; open: Poisson arrivals at fixed rates.")
+    parser.add_argument("--levels", default="1,2,4,8,16,32",
+                        help="Comma-separated concurrency levels (closed) or arrival rates per second (open).")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per level.")
+    parser.add_argument("--url", help="Chat server /chat URL; omit to drive an in-process assistant.")
+    parser.add_argument("--data", help="Processed data pickle for in-process runs (defaults to index/).")
+    parser.add_argument("--stub-latency-ms", type=float,
+                        help="Replace the inference API with a local stub that answers after this delay (in-process only).")
+    parser.add_argument("--output", default="load_test_results.json")
+    args = parser.parse_args()
+
+    query_log = load_query_log(args.queries)
+    if not query_log:
+        raise SystemExit(f"No queries found in {args.queries}.")
+
+    stub = None
+    if args.url:
+        load_target = HttpTarget(args.url)
+    else:
+        if args.data:
+            with open(args.data, "rb") as data_file:
+                processed_data = pickle.load(data_file)
+        else:
+            processed_data = IndexManager("index").load()
+        if not processed_data:
+            raise SystemExit("No processed data found. Build an index with main.py or pass --data.")
+        api_url = None
+        if args.stub_latency_ms is not None:
+            stub, api_url = start_mock_inference(latency_ms=args.stub_latency_ms)
+        load_target = InProcessTarget(AIChatAssistant(processed_data, api_url=api_url))
+
+    try:
+        levels = [float(level) if args.mode == 'open' else int(level) for level in args.levels.split(',')]
+        report = sweep(load_target, query_log, args.mode, levels, args.duration)
+    finally:
+        if stub is not None:
+            stub.shutdown()
+
+    report.update({'target': args.url or 'in-process', 'duration_s': args.duration, 'stub_latency_ms': args.stub_latency_ms})
+    with open(args.output, 'w') as output_file:
+        json.dump(report, output_file, indent=2)
+
+    if report['saturation'] is None:
+        print("No saturation observed; try higher levels.")
+    else:
+        print(f"Saturation point: {report['saturation']} ({'concurrent users' if args.mode == 'closed' else 'req/s'})")
+    print(f"Results written to {args.output}.")
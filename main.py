@@ -1,74 +1,68 @@
 # main.py
 
-import os
-import pickle
+import argparse
+import cProfile
+import json
+import pstats
+from datetime import datetime
+from urllib.parse import urljoin
 
-from scraper_utility import extract_and_store
-from text_processing_module import prepare_scraped_content
-from bot_framework import IntelligentBot
+import metrics
+from chatbot_module import AIChatAssistant
+from extract_url import load_site_urls
+from index_manager import IndexManager
 
-def execute():
+def execute(discover=False, site=None, sites_file="sites.json", index_dir="index"):
     print("Welcome to the InfoBot Assistant (Powered by HF Inference API)\n")
 
-    # 1. Specify the target URLs for content extraction
-    urls_to_scrape = {
-        "Homepage": "https://botpenguin.com/",
-        "Plans": "https://botpenguin.com/chatbot-pricing",
-        "Affiliates": "https://botpenguin.com/partners/chatbot-affiliate-program",
-        "Ecommerce": "https://botpenguin.com/chatbot-industry/ecommerce",
-        "Solutions": "https://botpenguin.com/solutions/custom-chatgpt-plugins",
-    }
-
-    # 2. Verify the existence of prior scraped content in extracted_data.pkl
-    extracted_data_file = "extracted_data.pkl"
-    if not os.path.exists(extracted_data_file):
-        print("No prior data located. Initiating website content extraction...")
-        extract_and_store(urls_to_scrape, output_file=extracted_data_file)
-    else:
-        print(f"Utilizing pre-existing scraped content from {extracted_data_file}.")
-
-    # 3. Retrieve the scraped data from extracted_data.pkl
+    # 1. Target URLs for content extraction are listed per site in sites.json
+    if site is None:
+        with open(sites_file, "r", encoding="utf-8") as file:
+            site = next(iter(json.load(file)))
     try:
-        with open(extracted_data_file, "rb") as file:
-            extracted_data = pickle.load(file)
-    except FileNotFoundError:
-        print("Error: Extracted data file missing. Terminating process.")
-        return
-    except Exception as error:
-        print(f"Encountered an issue while loading extracted data: {error}")
+        urls_to_scrape = load_site_urls(sites_file, site)
+    except ValueError as err:
+        print(err)
         return
+    print(f"Serving {site} from {sites_file}.")
 
-    # 4. Process the extracted data into usable chunks and embeddings if absent
-    processed_data_file = "finalized_data.pkl"
-    if not os.path.exists(processed_data_file):
-        print("\nTransforming extracted content into manageable chunks and embeddings...")
-        processed_data = prepare_scraped_content(
-            data=extracted_data,
-            embedding_model="all-MiniLM-L6-v2",  # Alternative embedding model can be used
-            chunk_size=300,  # Adjust chunk size parameter if needed
-            min_words=30     # Exclude excessively brief chunks
-        )
-        if not processed_data:
+    # Settings used for every index build, including background refreshes
+    build_settings = dict(
+        site_urls=urls_to_scrape,
+        selector="main",
+        archive_path="pages.warc.zst",
+        embedding_model="all-MiniLM-L6-v2",  # Alternative embedding model can be used
+        segment_size=300,  # Adjust chunk size parameter if needed
+        min_words=30       # Exclude excessively brief chunks
+    )
+    if discover:
+        # Seed the crawl from the sitemap too, re-fetching only pages whose lastmod changed
+        build_settings.update(base_url=urljoin(next(iter(urls_to_scrape.values())), "/"), changed_only=True)
+
+    # 2. Load the live index version, building the first one if none exists yet
+    index_manager = IndexManager(index_dir)
+    processed_data = index_manager.load()
+    if processed_data is None:
+        print("No index located. Initiating website content extraction and processing...")
+        if not index_manager.refresh(**build_settings):
             print("Data processing unsuccessful. Terminating process.")
             return
-
-        with open(processed_data_file, "wb") as output_file:
-            pickle.dump(processed_data, output_file)
-        print(f"Processed data successfully saved to {processed_data_file}.")
+        processed_data = index_manager.load()
     else:
-        print(f"Using pre-processed data from {processed_data_file}.")
-        with open(processed_data_file, "rb") as input_file:
-            processed_data = pickle.load(input_file)
+        print(f"Using index version {index_manager.current_version()}.")
 
-    # 5. Instantiate the chatbot using the processed data
-    assistant_bot = IntelligentBot(
-        processed_data=processed_data,
-        hf_model_id="google/flan-t5-base"  # Alternate IDs like "google/flan-t5-small" can be specified
+    # 3. Instantiate the chatbot using the processed data
+    assistant_bot = AIChatAssistant(
+        processed_data,
+        model_id="google/flan-t5-base",  # Alternate IDs like "google/flan-t5-small" can be specified
+        query_log="query_log.jsonl",  # Mined by answer_table.py for frequent questions
+        answer_table=index_manager.load_answer_table()
     )
 
-    print("\nAssistant is now operational! Type 'exit' to end the session.\n")
+    print("\nAssistant is now operational! Type 'exit' to end the session.")
+    print("Type 'refresh' to rebuild the index in the background, or 'rollback' to restore the previous one.\n")
 
-    # 6. Begin the interactive chat loop
+    # 4. Begin the interactive chat loop
     while True:
         try:
             user_query = input("User: ").strip()
@@ -78,9 +72,17 @@ def execute():
             if not user_query:
                 print("Please enter a valid query.")
                 continue
+            if user_query.lower() == "refresh":
+                # The assistant keeps answering from the live index until the new one is swapped in
+                index_manager.start_background_refresh(assistant_bot, **build_settings)
+                print("Index refresh started in the background.")
+                continue
+            if user_query.lower() == "rollback":
+                index_manager.rollback(assistant_bot)
+                continue
 
             # Fetch the bot's response to the user's query
-            bot_response = assistant_bot.generate_response(user_query)
+            bot_response = assistant_bot.get_response(user_query)
             print(f"Assistant: {bot_response}")
 
         except KeyboardInterrupt:
@@ -90,5 +92,45 @@ def execute():
             print(f"Unexpected error occurred: {ex}")
             break
 
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Web-scraping chatbot console.")
+    parser.add_argument("--profile", action="store_true",
+                        help="Run under cProfile and write a .prof trace (open with snakeviz or flameprof).")
+    parser.add_argument("--site", help="Site to serve from the sites file (defaults to the first one listed).")
+    parser.add_argument("--sites-file", default="sites.json", help="JSON file of {site: {label: url}}.")
+    parser.add_argument("--index", default="index", help="Index directory; use a separate one per site.")
+    parser.add_argument("--discover", action="store_true",
+                        help="Add every page in the site's sitemap and only re-fetch changed pages on refresh.")
+    parser.add_argument("--metrics", action="store_true",
+                        help="Collect stage timings and counters, and write a JSON snapshot on exit.")
+    parser.add_argument("--metrics-port", type=int,
+                        help="Also serve /metrics (Prometheus) and /metrics.json on this port.")
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    execute()
+    args = parse_arguments()
+    run_id = datetime.now().strftime("%Y%m%d-%H%M%S")
+
+    if args.metrics or args.metrics_port:
+        metrics.enable()
+    if args.metrics_port:
+        metrics.serve_metrics(args.metrics_port)
+        print(f"Metrics available at http://127.0.0.1:{args.metrics_port}/metrics")
+
+    profiler = cProfile.Profile() if args.profile else None
+    try:
+        if profiler:
+            profiler.runcall(execute, args.discover, args.site, args.sites_file, args.index)
+        else:
+            execute(args.discover, args.site, args.sites_file, args.index)
+    finally:
+        if profiler:
+            profile_file = f"profile-{run_id}.prof"
+            profiler.dump_stats(profile_file)
+            print(f"\nProfile written to {profile_file}. Top functions by cumulative time:")
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+        if metrics.is_enabled():
+            metrics_file = f"metrics-{run_id}.json"
+            with open(metrics_file, "w") as file:
+                json.dump(metrics.snapshot(), file, indent=2)
+            print(f"Metrics snapshot written to {metrics_file}.")
@@ -0,0 +1,193 @@
+# metrics.py
+
+import contextlib
+import heapq
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Off by default; every call below returns immediately while disabled
+_enabled = os.getenv("CHATBOT_METRICS", "0") == "1"
+
+# Histogram bucket upper bounds in seconds
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Slowest items (pages, sections) remembered per stage
+SLOWEST_ITEMS = 10
+
+_NOOP_SPAN = contextlib.nullcontext()
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_slowest = {}
+
+
+def enable(flag=True):
+    """
+    Turns metric collection on or off for the whole process.
+    """
+    global _enabled
+    _enabled = flag
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """
+    Clears every collected metric.
+    """
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _slowest.clear()
+
+
+def inc(name, value=1):
+    """
+    Adds `value` to a counter, e.g. inc("bytes_fetched_total", len(body)).
+    """
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def observe(name, value, item=None):
+    """
+    Records one sample in a histogram.
+
+    Args:
+        name (str): Histogram name, e.g. a stage name for durations.
+        value (float): The sample, in seconds for durations.
+        item (str): What the sample was about (page URL, section); the slowest are kept.
+    """
+    if not _enabled:
+        return
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = {'buckets': [0] * len(DURATION_BUCKETS), 'count': 0, 'sum': 0.0}
+        for position, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                histogram['buckets'][position] += 1
+                break
+        histogram['count'] += 1
+        histogram['sum'] += value
+
+        if item is not None:
+            slowest = _slowest.setdefault(name, [])
+            entry = (value, str(item))
+            if len(slowest) < SLOWEST_ITEMS:
+                heapq.heappush(slowest, entry)
+            elif entry > slowest[0]:
+                heapq.heapreplace(slowest, entry)
+
+
+class _Span:
+    __slots__ = ('name', 'item', 'start')
+
+    def __init__(self, name, item):
+        self.name = name
+        self.item = item
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        observe(self.name, time.perf_counter() - self.start, self.item)
+
+
+def span(name, item=None):
+    """
+    Times a block of code into the `name` duration histogram.
+
+    Usage:
+        with metrics.span("similarity_scan"):
+            ...
+
+    Returns a shared no-op context manager while metrics are disabled.
+    """
+    if not _enabled:
+        return _NOOP_SPAN
+    return _Span(name, item)
+
+
+def snapshot():
+    """
+    Returns all metrics as a JSON-serializable dict.
+    """
+    with _lock:
+        histograms = {}
+        for name, histogram in _histograms.items():
+            histograms[name] = {
+                'count': histogram['count'],
+                'sum_s': histogram['sum'],
+                'mean_ms': histogram['sum'] / histogram['count'] * 1000 if histogram['count'] else 0.0,
+                'buckets': dict(zip((str(bound) for bound in DURATION_BUCKETS), histogram['buckets'])),
+            }
+            if name in _slowest:
+                histograms[name]['slowest'] = [
+                    {'item': item, 'ms': value * 1000} for value, item in sorted(_slowest[name], reverse=True)
+                ]
+        return {'counters': dict(_counters), 'histograms': histograms}
+
+
+def render_prometheus():
+    """
+    Renders all metrics in the Prometheus text exposition format.
+    """
+    lines = []
+    with _lock:
+        for name, value in sorted(_counters.items()):
+            lines.append(f"# TYPE chatbot_{name} counter")
+            lines.append(f"chatbot_{name} {value}")
+
+        if _histograms:
+            lines.append("# TYPE chatbot_stage_duration_seconds histogram")
+        for name, histogram in sorted(_histograms.items()):
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS, histogram['buckets']):
+                cumulative += count
+                lines.append(f'chatbot_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'chatbot_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {histogram["count"]}')
+            lines.append(f'chatbot_stage_duration_seconds_sum{{stage="{name}"}} {histogram["sum"]}')
+            lines.append(f'chatbot_stage_duration_seconds_count{{stage="{name}"}} {histogram["count"]}')
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = render_prometheus(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, content_type = json.dumps(snapshot(), indent=2), "application/json"
+        else:
+            self.send_error(404)
+            return
+        payload = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port=9100, host="127.0.0.1"):
+    """
+    Exposes /metrics (Prometheus text) and /metrics.json on a background thread.
+
+    Returns:
+        ThreadingHTTPServer: The running server; call shutdown() to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
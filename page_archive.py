@@ -0,0 +1,228 @@
+# page_archive.py
+
+import json
+import os
+from datetime import datetime, timezone
+
+import requests
+import zstandard
+
+import metrics
+
+# Headers describing the transfer rather than the page; the archived body is already decoded
+_TRANSFER_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection'}
+
+
+class PageArchive:
+    def __init__(self, archive_path, compression_level=3):
+        """
+        Append-only archive of raw HTTP responses in a WARC-like format.
+
+        Every response is stored as its own zstd frame in `archive_path`, so a
+        record can be decompressed without touching its neighbours. A JSON-lines
+        index next to it (`<archive_path>.idx`) maps each URL to the offset and
+        length of its latest record.
+
+        Args:
+            archive_path (str): Path of the compressed archive, e.g. 'pages.warc.zst'.
+            compression_level (int): zstd compression level.
+        """
+        self.archive_path = archive_path
+        self.index_path = f"{archive_path}.idx"
+        self.compressor = zstandard.ZstdCompressor(level=compression_level)
+        self.decompressor = zstandard.ZstdDecompressor()
+        self.index = self._load_index()
+        self._writer = None
+        self._reader = None
+
+    def _load_index(self):
+        """
+        Reads the offset index, keeping the latest entry per URL.
+        """
+        index = {}
+        if not os.path.exists(self.index_path):
+            return index
+        archive_size = os.path.getsize(self.archive_path) if os.path.exists(self.archive_path) else 0
+        with open(self.index_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Torn final line from an interrupted write
+                if entry['offset'] + entry['length'] <= archive_size:
+                    index[entry['url']] = entry
+        return index
+
+    def append(self, url, status_code, headers, body, fetched_at=None, encoding=None):
+        """
+        Appends one raw response to the archive.
+
+        Args:
+            url (str): The fetched URL.
+            status_code (int): HTTP status code.
+            headers (dict): Response headers.
+            body (bytes): Decoded response body.
+            fetched_at (str): ISO-8601 fetch time (defaults to now).
+            encoding (str): Character encoding of the body, if known.
+        """
+        fetched_at = fetched_at or datetime.now(timezone.utc).isoformat()
+        http_block = f"HTTP/1.1 {status_code}\r\n"
+        for name, value in headers.items():
+            if name.lower() not in _TRANSFER_HEADERS:
+                http_block += f"{name}: {value}\r\n"
+        payload = http_block.encode('utf-8') + b"\r\n" + body
+
+        warc_block = (
+            "WARC/1.0\r\n"
+            "WARC-Type: response\r\n"
+            f"WARC-Target-URI: {url}\r\n"
+            f"WARC-Date: {fetched_at}\r\n"
+            f"WARC-Payload-Encoding: {encoding or ''}\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            "\r\n"
+        )
+        frame = self.compressor.compress(warc_block.encode('utf-8') + payload)
+
+        if self._writer is None:
+            self._writer = open(self.archive_path, 'ab')
+        self._writer.seek(0, os.SEEK_END)
+        offset = self._writer.tell()
+        self._writer.write(frame)
+        self._writer.flush()
+
+        # The index line is written only after the record is on disk
+        entry = {'url': url, 'offset': offset, 'length': len(frame), 'fetched_at': fetched_at}
+        with open(self.index_path, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(entry) + "\n")
+        self.index[url] = entry
+
+    def get(self, url):
+        """
+        Returns the latest archived response for a URL.
+
+        Returns:
+            dict: url, fetched_at, status_code, headers, body (bytes) and encoding,
+            or None if the URL was never archived.
+        """
+        entry = self.index.get(url)
+        if entry is None:
+            return None
+        if self._writer is not None:
+            self._writer.flush()
+        if self._reader is None:
+            self._reader = open(self.archive_path, 'rb')
+        self._reader.seek(entry['offset'])
+        record = self.decompressor.decompress(self._reader.read(entry['length']))
+        return self._parse_record(record)
+
+    def urls(self):
+        """
+        Lists archived URLs in the order they were first fetched.
+        """
+        return list(self.index)
+
+    def iter_records(self):
+        """
+        Yields the latest archived response for every URL.
+        """
+        for url in self.urls():
+            yield self.get(url)
+
+    @staticmethod
+    def _parse_record(record):
+        """
+        Splits a decompressed record into its WARC fields, HTTP headers and body.
+        """
+        warc_block, _, payload = record.partition(b"\r\n\r\n")
+        http_block, _, body = payload.partition(b"\r\n\r\n")
+
+        warc_fields = {}
+        for line in warc_block.decode('utf-8').split("\r\n")[1:]:
+            name, _, value = line.partition(': ')
+            warc_fields[name] = value
+
+        http_lines = http_block.decode('utf-8').split("\r\n")
+        status_code = int(http_lines[0].split()[1])
+        headers = {}
+        for line in http_lines[1:]:
+            name, _, value = line.partition(': ')
+            headers[name] = value
+
+        return {
+            'url': warc_fields.get('WARC-Target-URI'),
+            'fetched_at': warc_fields.get('WARC-Date'),
+            'status_code': status_code,
+            'headers': headers,
+            'body': body,
+            'encoding': warc_fields.get('WARC-Payload-Encoding') or None,
+        }
+
+    def close(self):
+        """
+        Closes the archive's file handles.
+        """
+        for handle in (self._writer, self._reader):
+            if handle is not None:
+                handle.close()
+        self._writer = self._reader = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def fetch_html(url, archive=None, replay=False, timeout=10):
+    """
+    Fetches a page's HTML, recording it in or replaying it from an archive.
+
+    Args:
+        url (str): The URL to fetch.
+        archive (PageArchive): Archive to write responses to, or read them from in replay mode (optional).
+        replay (bool): Serve the page from the archive without touching the network.
+        timeout (int): Request timeout in seconds.
+
+    Returns:
+        str: The page HTML.
+
+    Raises:
+        requests.exceptions.RequestException: If the request fails or the page
+            is missing from the archive in replay mode.
+    """
+    if replay:
+        record = archive.get(url) if archive is not None else None
+        if record is None:
+            metrics.inc("archive_misses_total")
+            raise requests.exceptions.RequestException(f"{url} is not in the page archive")
+        metrics.inc("archive_hits_total")
+        return record['body'].decode(record['encoding'] or 'utf-8', errors='replace')
+
+    try:
+        with metrics.span("http_fetch", item=url):
+            response = requests.get(url, timeout=timeout)
+    except requests.exceptions.RequestException:
+        metrics.inc("fetch_errors_total")
+        raise
+    metrics.inc("pages_fetched_total")
+    metrics.inc("bytes_fetched_total", len(response.content))
+    if response.status_code >= 400:
+        metrics.inc("fetch_errors_total")
+    response.raise_for_status()
+    if archive is not None:
+        archive.append(
+            url,
+            response.status_code,
+            dict(response.headers),
+            response.content,
+            encoding=response.encoding
+        )
+    return response.text
+
+
+if __name__ == '__main__':
+    # Summarize the contents of an existing archive
+    with PageArchive('pages.warc.zst') as page_archive:
+        print(f"{len(page_archive.index)} pages archived in {page_archive.archive_path}:")
+        for entry in page_archive.index.values():
+            print(f"{entry['fetched_at']}  {entry['url']}")
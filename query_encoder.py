@@ -0,0 +1,240 @@
+import gc
+import io
+import json
+import os
+import pickle
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+import torch
+from sentence_transformers import SentenceTransformer
+
+ENCODER_MODES = ("float", "int8", "onnx")
+
+
+def load_query_encoder(model_name, mode="float", onnx_file=None):
+    """
+    Loads the query encoder used on the retrieval hot path.
+
+    All modes return an object with the SentenceTransformer `encode` API, so
+    they can stand in for each other as `AIChatAssistant.vectorizer`.
+
+    Args:
+        model_name (str): SentenceTransformer model the index was built with.
+        mode (str): "float" for the full-precision model, "int8" for dynamic int8
+            quantization of its Linear layers, or "onnx" for the ONNX Runtime backend.
+        onnx_file (str): ONNX file inside the model repo to load, e.g. a pre-quantized
+            "onnx/model_qint8_avx2.onnx" (onnx mode only, optional).
+
+    Returns:
+        SentenceTransformer: The loaded encoder.
+    """
+    if mode == "float":
+        return SentenceTransformer(model_name)
+    if mode == "int8":
+        # Quantized kernels are CPU-only; weights become int8, activations stay float.
+        # In place, so the float weights are released instead of living on in a deep copy.
+        model = SentenceTransformer(model_name, device="cpu")
+        return _quantize_int8(model)
+    if mode == "onnx":
+        model_kwargs = {"file_name": onnx_file} if onnx_file else None
+        return SentenceTransformer(model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+    raise ValueError(f"Unknown query encoder mode '{mode}', expected one of {ENCODER_MODES}.")
+
+
+def _quantize_int8(model):
+    """
+    Quantizes the model's Linear layers to int8 weights with dynamic activation scales, in place.
+
+    Uses torchao when it is installed. torch.ao.quantization is deprecated and
+    only serves as the fallback on torch releases that still ship it.
+    """
+    try:
+        from torchao.quantization import Int8DynamicActivationInt8WeightConfig, quantize_
+    except ImportError:
+        try:
+            from torch.ao.quantization import quantize_dynamic
+        except ImportError:
+            raise ImportError("int8 mode needs torchao on this torch release: pip install torchao") from None
+        return quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    quantize_(model, Int8DynamicActivationInt8WeightConfig())
+    return model
+
+
+def current_rss_bytes():
+    """
+    Returns the resident set size of this process (peak RSS where /proc is unavailable).
+    """
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _state_dict_bytes(encoder):
+    """
+    Returns the serialized size of the encoder's weights, or None for non-torch backends.
+    """
+    try:
+        buffer = io.BytesIO()
+        torch.save(encoder.state_dict(), buffer)
+        return buffer.tell()
+    except Exception:
+        return None
+
+
+def _footprint_in_this_process(model_name, mode="float", onnx_file=None):
+    """
+    Measures the second load of an encoder in a fresh process.
+
+    The first load pays one-time costs (library initialisation, allocator
+    arenas, thread pools) and is kept alive, so the second load cannot reuse
+    memory it freed; the growth from the second load is the model itself.
+    """
+    warm_encoder = load_query_encoder(model_name, mode, onnx_file)
+    gc.collect()
+    rss_before = current_rss_bytes()
+    encoder = load_query_encoder(model_name, mode, onnx_file)
+    gc.collect()
+    rss_after = current_rss_bytes()
+    del warm_encoder
+
+    # ONNX Runtime owns its weights outside torch, so only RSS is meaningful there
+    weight_bytes = None if mode == "onnx" else _state_dict_bytes(encoder)
+    return {
+        'rss_delta_mb': (rss_after - rss_before) / 2**20,
+        'weights_mb': weight_bytes / 2**20 if weight_bytes is not None else None,
+    }
+
+
+def measure_footprint(model_name, mode="float", onnx_file=None):
+    """
+    Measures the memory an encoder adds to a serving process.
+
+    Each mode is measured in a fresh subprocess, so neither one-time library
+    set-up nor models loaded earlier (such as the float reference) are
+    counted against it.
+
+    Returns:
+        dict: The RSS growth caused by loading the encoder and the serialized
+        weight size (None for ONNX).
+    """
+    command = [sys.executable, os.path.abspath(__file__), "--footprint", model_name, mode]
+    if onnx_file:
+        command.append(onnx_file)
+    result = subprocess.run(command, capture_output=True, text=True, check=True)
+    # The report is the last line; model loading may print progress before it
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _encode_latency(encoder, queries):
+    """
+    Times one `encode` call per query and returns the vectors and p50/p99 in milliseconds.
+    """
+    encoder.encode(queries[0], convert_to_tensor=True)  # Warm-up
+    vectors, samples = [], []
+    for query in queries:
+        start = time.perf_counter()
+        vectors.append(encoder.encode(query, convert_to_tensor=True).float().cpu())
+        samples.append((time.perf_counter() - start) * 1000)
+    return torch.stack(vectors), {
+        'p50_ms': float(np.percentile(samples, 50)),
+        'p99_ms': float(np.percentile(samples, 99)),
+    }
+
+
+def compare_encoders(reference, candidate, data_store, queries, k=5):
+    """
+    Checks that a candidate encoder agrees with the float model the index was built with.
+
+    Args:
+        reference: The full-precision encoder.
+        candidate: The quantized or ONNX encoder.
+        data_store (dict): Processed data whose chunk embeddings are searched.
+        queries (list): Query strings.
+        k (int): Cut-off for the top-k overlap.
+
+    Returns:
+        dict: Mean/min cosine agreement of the query vectors, mean top-k overlap of
+        the retrieved chunks, and encode latency for both encoders.
+    """
+    index = torch.cat([
+        section_data["embeddings"].float().cpu()
+        for section, section_data in data_store.items()
+        if not section.startswith("_") and section_data.get("chunks")
+    ])
+    index = torch.nn.functional.normalize(index, dim=-1)
+
+    reference_vectors, reference_latency = _encode_latency(reference, queries)
+    candidate_vectors, candidate_latency = _encode_latency(candidate, queries)
+
+    agreement = torch.nn.functional.cosine_similarity(reference_vectors, candidate_vectors, dim=-1)
+
+    top_k = min(k, index.shape[0])
+    reference_top = (torch.nn.functional.normalize(reference_vectors, dim=-1) @ index.T).topk(top_k).indices
+    candidate_top = (torch.nn.functional.normalize(candidate_vectors, dim=-1) @ index.T).topk(top_k).indices
+    overlap = [
+        len(set(ref.tolist()) & set(cand.tolist())) / top_k
+        for ref, cand in zip(reference_top, candidate_top)
+    ]
+
+    return {
+        'queries': len(queries),
+        'cosine_mean': float(agreement.mean()),
+        'cosine_min': float(agreement.min()),
+        f'top{k}_overlap': float(np.mean(overlap)),
+        'reference_latency': reference_latency,
+        'candidate_latency': candidate_latency,
+    }
+
+
+if __name__ == "__main__":
+    """
+    Usage: python query_encoder.py [int8|onnx] [processed_data.pkl]
+
+    Verifies a faster query encoder against the float model before serving it.
+    """
+    if len(sys.argv) > 1 and sys.argv[1] == "--footprint":
+        # Child process of measure_footprint
+        print(json.dumps(_footprint_in_this_process(*sys.argv[2:5])))
+        sys.exit(0)
+
+    from retrieval_report import sample_queries
+
+    candidate_mode = sys.argv[1] if len(sys.argv) > 1 else "int8"
+    data_file = sys.argv[2] if len(sys.argv) > 2 else "processed_data.pkl"
+
+    with open(data_file, "rb") as file:
+        data_store = pickle.load(file)
+    model_name = data_store.get("_embedding_model", "all-MiniLM-L6-v2")
+
+    reference_footprint = measure_footprint(model_name, "float")
+    candidate_footprint = measure_footprint(model_name, candidate_mode)
+    reference_encoder = load_query_encoder(model_name, "float")
+    candidate_encoder = load_query_encoder(model_name, candidate_mode)
+
+    report = compare_encoders(reference_encoder, candidate_encoder, data_store, sample_queries(data_store), k=5)
+
+    print(f"Model: {model_name}   candidate: {candidate_mode}   queries: {report['queries']}")
+    print(f"Cosine agreement: mean {report['cosine_mean']:.4f}   min {report['cosine_min']:.4f}")
+    print(f"Top-5 overlap: {report['top5_overlap']:.3f}")
+    for label, latency, footprint in (
+        ("float", report['reference_latency'], reference_footprint),
+        (candidate_mode, report['candidate_latency'], candidate_footprint),
+    ):
+        weights = f"{footprint['weights_mb']:.1f} MB" if footprint['weights_mb'] else "n/a"
+        print(
+            f"{label:6s} p50 {latency['p50_ms']:.2f} ms   p99 {latency['p99_ms']:.2f} ms   "
+            f"RSS +{footprint['rss_delta_mb']:.1f} MB   weights {weights}"
+        )
+
+    # Retrieval should be unchanged for practical purposes before switching encoders
+    if report['cosine_min'] >= 0.98 and report['top5_overlap'] >= 0.9:
+        print(f"OK: '{candidate_mode}' tracks the float encoder closely enough to serve.")
+    else:
+        print(f"WARNING: '{candidate_mode}' drifts from the float encoder; keep serving 'float'.")
+        sys.exit(1)
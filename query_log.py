@@ -0,0 +1,50 @@
+# query_log.py
+
+import json
+import threading
+import time
+
+
+class QueryLog:
+    def __init__(self, path):
+        """
+        Append-only JSON lines log of the queries the assistant receives.
+
+        Each line is {"query": ..., "session_id": ..., "site": ..., "ts": ...},
+        the format load_query_log reads back for load tests and answer tables.
+
+        Args:
+            path (str): Log file, created if missing.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8', buffering=1)
+
+    def record(self, query, session_id=None, site=None):
+        line = json.dumps({"query": query, "session_id": session_id, "site": site, "ts": round(time.time(), 3)})
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def load_query_log(path):
+    """
+    Reads queries from a text file (one per line) or JSON lines with a "query" field.
+
+    Returns:
+        list: Query strings in log order.
+    """
+    queries = []
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('{'):
+                line = json.loads(line).get('query', '').strip()
+            if line:
+                queries.append(line)
+    return queries
@@ -0,0 +1,118 @@
+import pickle
+import random
+import sys
+import time
+
+import numpy as np
+
+from chatbot_module import AIChatAssistant
+
+
+def sample_queries(data_store, num_queries=200, words=12, seed=0):
+    """
+    Builds pseudo-queries from random word windows of the indexed chunks.
+
+    Args:
+        data_store (dict): Processed data with chunks per section.
+        num_queries (int): Number of queries to draw.
+        words (int): Words per query.
+        seed (int): Random seed for reproducible reports.
+
+    Returns:
+        list: Query strings.
+    """
+    rng = random.Random(seed)
+    chunks = [
+        chunk
+        for section, section_data in data_store.items()
+        if not section.startswith("_")
+        for chunk in section_data["chunks"]
+    ]
+    queries = []
+    for _ in range(num_queries):
+        chunk_words = rng.choice(chunks).split()
+        start = rng.randrange(max(1, len(chunk_words) - words))
+        queries.append(' '.join(chunk_words[start:start + words]))
+    return queries
+
+
+def routing_report(assistant, queries, k=3):
+    """
+    Compares centroid-routed retrieval with the full scan on the same queries.
+
+    Args:
+        assistant (AIChatAssistant): Assistant whose index is measured.
+        queries (list): Query strings.
+        k (int): Cut-off for the top-k recall figure.
+
+    Returns:
+        dict: Recall@1, recall@k, full-scan fallback rate and scan latencies in milliseconds.
+    """
+    # Encode up front so both timings cover only the similarity scan
+    vectors = [assistant.vectorizer.encode(query, convert_to_tensor=True) for query in queries]
+
+    hits_at_1 = 0
+    recall_at_k = []
+    fallbacks = 0
+    routed_times, full_times = [], []
+    total_sections = len(assistant._routing[2])
+
+    for vector in vectors:
+        start = time.perf_counter()
+        full = assistant._rank_chunks(vector, top_n=k, threshold=-1.0, full_scan=True)
+        full_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        routed = assistant._rank_chunks(vector, top_n=k, threshold=-1.0)
+        routed_times.append(time.perf_counter() - start)
+
+        if len(assistant._route_sections(vector, assistant._routing)) == total_sections:
+            fallbacks += 1
+
+        full_top = [(section, index) for _, section, index, _ in full[:k]]
+        routed_top = [(section, index) for _, section, index, _ in routed[:k]]
+        if full_top and routed_top and full_top[0] == routed_top[0]:
+            hits_at_1 += 1
+        if full_top:
+            recall_at_k.append(len(set(full_top) & set(routed_top)) / len(full_top))
+
+    def latency(samples):
+        samples_ms = np.array(samples) * 1000
+        return {
+            'p50_ms': float(np.percentile(samples_ms, 50)),
+            'p99_ms': float(np.percentile(samples_ms, 99)),
+            'mean_ms': float(samples_ms.mean()),
+        }
+
+    return {
+        'queries': len(queries),
+        'sections': total_sections,
+        'top_sections': assistant.top_sections,
+        'routing_margin': assistant.routing_margin,
+        'recall_at_1': hits_at_1 / len(queries),
+        f'recall_at_{k}': float(np.mean(recall_at_k)) if recall_at_k else 0.0,
+        'full_scan_fallback_rate': fallbacks / len(queries),
+        'routed_scan': latency(routed_times),
+        'full_scan': latency(full_times),
+    }
+
+
+if __name__ == "__main__":
+    """
+    Usage: python retrieval_report.py [processed_data.pkl] [top_sections]
+    """
+    data_file = sys.argv[1] if len(sys.argv) > 1 else "processed_data.pkl"
+    top_sections = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    with open(data_file, "rb") as file:
+        data_store = pickle.load(file)
+
+    assistant = AIChatAssistant(data_store, top_sections=top_sections)
+    report = routing_report(assistant, sample_queries(data_store))
+
+    print(f"Queries: {report['queries']} over {report['sections']} sections (top {report['top_sections']} scanned)")
+    print(f"Recall@1: {report['recall_at_1']:.3f}   Recall@3: {report['recall_at_3']:.3f}")
+    print(f"Full-scan fallbacks: {report['full_scan_fallback_rate']:.1%}")
+    for mode in ('routed_scan', 'full_scan'):
+        stats = report[mode]
+        print(f"{mode:12s} p50 {stats['p50_ms']:.3f} ms   p99 {stats['p99_ms']:.3f} ms   mean {stats['mean_ms']:.3f} ms")
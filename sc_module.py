@@ -132,14 +132,10 @@ def scrape_and_save(website_urls, output_file, hover_selector=None):
 
 
 if __name__ == '__main__':
-    # Define the website URLs to scrape
-    website_urls = {
-        "Home": "https://botpenguin.com/",
-        "Pricing": "https://botpenguin.com/chatbot-pricing",
-        "Partners": "https://botpenguin.com/partners/chatbot-affiliate-program",
-        "Ecommerce Industry": "https://botpenguin.com/chatbot-industry/ecommerce",
-        "Solutions": "https://botpenguin.com/solutions/custom-chatgpt-plugins",
-    }
+    from extract_url import load_site_urls
+
+    # Website URLs to scrape are listed per site in sites.json
+    website_urls = load_site_urls("sites.json")
 
     # Specify a hover selector for dynamic content (optional)
     hover_selector = ".hover-target"  # Replace with the actual CSS selector for hover elements
@@ -4,6 +4,12 @@ import requests
 from bs4 import BeautifulSoup
 import pickle
 import re
+import sys
+from urllib.parse import urljoin
+
+import metrics
+from link_graph import LinkGraph
+from page_archive import PageArchive, fetch_html
 
 def sanitize_page_content(page_content):
     """
@@ -43,12 +49,12 @@ def fetch_links(html_content, base_url):
             continue
         # Resolve relative URLs to absolute
         if href.startswith('/'):
-            found_links[href] = f'{base_url.rstrip("/")}{href}'
+            found_links[href] = urljoin(base_url, href)
         elif href.startswith('http'):
             found_links[href] = href
     return found_links
 
-def scrape_page(url, section_label, selector=None):
+def scrape_page(url, section_label, selector=None, archive=None, replay=False):
     """
     Scrapes a URL, cleans content, and extracts links.
 
@@ -56,20 +62,28 @@ def scrape_page(url, section_label, selector=None):
         url (str): The URL to scrape.
         section_label (str): A label for the section being scraped.
         selector (str): CSS selector for targeting specific content (optional).
+        archive (PageArchive): Archive that records raw responses (optional).
+        replay (bool): Read the page from `archive` instead of the network.
 
     Returns:
         tuple: Cleaned text content and a dictionary of extracted links.
     """
     print(f"Scraping {section_label} ({url})...")
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
+        html = fetch_html(url, archive=archive, replay=replay)
     except requests.exceptions.RequestException as error:
         print(f"Error accessing {url}: {error}")
         return None, None
 
+    with metrics.span("parse_page", item=url):
+        return _parse_page(html, url, section_label, selector)
+
+def _parse_page(html, url, section_label, selector):
+    """
+    Extracts the cleaned text and links from fetched HTML.
+    """
     # Parse the HTML response
-    soup = BeautifulSoup(response.text, 'html.parser')
+    soup = BeautifulSoup(html, 'html.parser')
 
     # Extract specific content if a selector is provided
     if selector:
@@ -88,43 +102,123 @@ def scrape_page(url, section_label, selector=None):
 
     return clean_content, page_links
 
-def extract_and_store(site_urls, output_filename, selector=None):
+def plan_crawl(site_urls, previous_graph=None, page_budget=None):
     """
-    Scrapes multiple URLs and saves structured data to a file.
+    Orders sections so the pages most linked to in the previous crawl are fetched first.
+
+    Args:
+        site_urls (dict): A dictionary of section labels and their URLs.
+        previous_graph (LinkGraph): Link graph of the previous crawl (optional).
+        page_budget (int): Maximum number of pages to fetch (optional).
+
+    Returns:
+        list: (section, url) pairs in fetch order.
+    """
+    sections = list(site_urls.items())
+    if previous_graph is not None:
+        return previous_graph.crawl_order(sections, page_budget, key=lambda section: section[1])
+    return sections[:page_budget] if page_budget is not None else sections
+
+def collect_pages(site_urls, selector=None, archive=None, replay=False, previous_graph=None, page_budget=None):
+    """
+    Scrapes multiple URLs into the structured {section: {'text', 'url'}} format.
+
+    Links are not kept per section; every page's links go into one shared
+    LinkGraph stored under the '_link_graph' key.
 
     Args:
         site_urls (dict): A dictionary of section labels and their URLs.
-        output_filename (str): The filename for storing the scraped data.
         selector (str): CSS selector for targeting specific content (optional).
+        archive (PageArchive): Archive that records raw responses (optional).
+        replay (bool): Rebuild from `archive` without touching the network.
+        previous_graph (LinkGraph): Previous crawl's link graph, used to fetch the most linked pages first (optional).
+        page_budget (int): Maximum number of pages to fetch (optional).
+
+    Returns:
+        dict: Scraped text and URL per section, plus the crawl's '_link_graph'.
     """
     aggregated_data = {}
+    link_graph = LinkGraph()
 
-    for section, site_url in site_urls.items():
-        clean_content, extracted_links = scrape_page(site_url, section, selector)
+    for section, site_url in plan_crawl(site_urls, previous_graph, page_budget):
+        clean_content, extracted_links = scrape_page(site_url, section, selector, archive, replay)
         if clean_content:
+            link_graph.add_page(site_url, extracted_links.values())
             aggregated_data[section] = {
                 'text': clean_content,
-                'links': extracted_links
+                'url': site_url
             }
             print(f"Data collected for {section}.")
 
+    aggregated_data['_link_graph'] = link_graph
+    return aggregated_data
+
+def replay_archive(archive_path, site_urls=None, selector=None, previous_graph=None, page_budget=None):
+    """
+    Rebuilds scraped data from a page archive at disk speed, without network access.
+
+    Args:
+        archive_path (str): Path of the page archive written by extract_and_store.
+        site_urls (dict): Section labels and URLs to replay; defaults to every
+            archived URL, labelled by the URL itself.
+        selector (str): CSS selector for targeting specific content (optional).
+        previous_graph (LinkGraph): Link graph deciding which pages come first (optional).
+        page_budget (int): Maximum number of pages to replay (optional).
+
+    Returns:
+        dict: Scraped text and URL per section, plus the crawl's '_link_graph'.
+    """
+    with PageArchive(archive_path) as archive:
+        if site_urls is None:
+            site_urls = {url: url for url in archive.urls()}
+        return collect_pages(site_urls, selector, archive=archive, replay=True,
+                             previous_graph=previous_graph, page_budget=page_budget)
+
+def extract_and_store(site_urls, output_filename, selector=None, archive_path=None, replay=False,
+                      previous_graph=None, page_budget=None):
+    """
+    Scrapes multiple URLs and saves structured data to a file.
+
+    Args:
+        site_urls (dict): A dictionary of section labels and their URLs.
+        output_filename (str): The filename for storing the scraped data.
+        selector (str): CSS selector for targeting specific content (optional).
+        archive_path (str): Page archive to record raw responses in (optional).
+        replay (bool): Rebuild from `archive_path` instead of scraping over the network.
+        previous_graph (LinkGraph): Previous crawl's link graph, used to fetch the most linked pages first (optional).
+        page_budget (int): Maximum number of pages to fetch (optional).
+    """
+    crawl_kwargs = dict(previous_graph=previous_graph, page_budget=page_budget)
+    if replay:
+        aggregated_data = replay_archive(archive_path, site_urls, selector, **crawl_kwargs)
+    elif archive_path:
+        with PageArchive(archive_path) as archive:
+            aggregated_data = collect_pages(site_urls, selector, archive=archive, **crawl_kwargs)
+    else:
+        aggregated_data = collect_pages(site_urls, selector, **crawl_kwargs)
+
     # Save the aggregated data to a pickle file
     with open(output_filename, 'wb') as file:
         pickle.dump(aggregated_data, file)
     print(f"Data successfully saved to {output_filename}.")
 
 if __name__ == '__main__':
-    # Define the target URLs for scraping
-    site_urls = {
-        "Homepage": "https://botpenguin.com/",
-        "Pricing Details": "https://botpenguin.com/chatbot-pricing",
-        "Affiliate Program": "https://botpenguin.com/partners/chatbot-affiliate-program",
-        "Ecommerce Sector": "https://botpenguin.com/chatbot-industry/ecommerce",
-        "Custom Solutions": "https://botpenguin.com/solutions/custom-chatgpt-plugins",
-    }
+    from extract_url import load_site_urls
+
+    # Target URLs for scraping are listed per site in sites.json
+    site_urls = load_site_urls("sites.json")
 
     # Specify a CSS selector for main content (use developer tools to find this)
     main_content_selector = "main"  # Example: Use <main> tag or customize as needed
 
+    # Pass --replay to rebuild from the page archive without network access
+    replay_mode = '--replay' in sys.argv
+
     # Perform scraping and save the results to 'aggregated_data.pkl'
-    extract_and_store(site_urls, 'aggregated_data.pkl', main_content_selector)
+    extract_and_store(
+        site_urls,
+        'aggregated_data.pkl',
+        main_content_selector,
+        archive_path='pages.warc.zst',
+        replay=replay_mode
+    )
@@ -1,9 +1,15 @@
 # scraper_module.py
 
+import contextlib
 import requests
 from bs4 import BeautifulSoup
 import pickle
 import re
+from urllib.parse import urljoin
+
+from link_graph import LinkGraph
+from page_archive import PageArchive, fetch_html
+from scraper_mod import plan_crawl
 
 
 def clean_webpage_content(webpage_content):
@@ -53,13 +59,13 @@ def extract_links(website_html, base_url):
             continue
         # Resolve relative URLs to absolute
         if href.startswith('/'):
-            links[href] = f'{base_url.rstrip("/")}{href}'
+            links[href] = urljoin(base_url, href)
         elif href.startswith('http'):
             links[href] = href
     return links
 
 
-def scrape_website(url, label, content_selector=None):
+def scrape_website(url, label, content_selector=None, archive=None, replay=False):
     """
     Scrapes the specified URL, extracts and cleans content, and finds all links.
 
@@ -67,20 +73,21 @@ def scrape_website(url, label, content_selector=None):
         url (str): The URL to scrape.
         label (str): A label for the section being scraped.
         content_selector (str): CSS selector to target the main content (optional).
+        archive (PageArchive): Archive that records raw responses (optional).
+        replay (bool): Read the page from `archive` instead of the network.
 
     Returns:
         tuple: A tuple containing the cleaned content and a list of extracted links.
     """
     print(f"Scraping {label} ({url})...")
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
+        html = fetch_html(url, archive=archive, replay=replay)
     except requests.exceptions.RequestException as e:
         print(f"Error making request to {url}: {e}")
         return None, None
 
     # Parse HTML content
-    soup = BeautifulSoup(response.text, 'html.parser')
+    soup = BeautifulSoup(html, 'html.parser')
 
     # If a specific content selector is provided, use it
     if content_selector:
@@ -104,7 +111,8 @@ def scrape_website(url, label, content_selector=None):
     return cleaned_content, links_list
 
 
-def scrape_and_save(website_urls, output_file, content_selector=None):
+def scrape_and_save(website_urls, output_file, content_selector=None, archive_path=None, replay=False,
+                    previous_graph=None, page_budget=None):
     """
     Scrapes multiple URLs and saves the results to a file in a structured format.
 
@@ -112,17 +120,29 @@ def scrape_and_save(website_urls, output_file, content_selector=None):
         website_urls (dict): A dictionary of labels and their corresponding URLs to scrape.
         output_file (str): The file to save the scraped data.
         content_selector (str): CSS selector to target the main content of the webpage (optional).
+        archive_path (str): Page archive to record raw responses in, or replay them from (optional).
+        replay (bool): Rebuild from `archive_path` instead of scraping over the network.
+        previous_graph (LinkGraph): Previous crawl's link graph; its most linked pages are scraped first (optional).
+        page_budget (int): Maximum number of pages to scrape (optional).
     """
     all_data = {}
+    link_graph = LinkGraph()
+
+    pages = plan_crawl(website_urls, previous_graph, page_budget)
 
-    for label, url in website_urls.items():
-        cleaned_content, links_list = scrape_website(url, label, content_selector)
-        if cleaned_content:
-            all_data[label] = {
-                'context': cleaned_content,
-                'links': links_list
-            }
-            print(f"Data extracted for {label}.")
+    with PageArchive(archive_path) if archive_path else contextlib.nullcontext() as archive:
+        for label, url in pages:
+            cleaned_content, links_list = scrape_website(url, label, content_selector, archive, replay)
+            if cleaned_content:
+                # Links go into one shared graph instead of a dict of URL strings per page
+                link_graph.add_page(url, links_list.values())
+                all_data[label] = {
+                    'context': cleaned_content,
+                    'url': url
+                }
+                print(f"Data extracted for {label}.")
+
+    all_data['_link_graph'] = link_graph
 
     # Save all data to a pickle file
     with open(output_file, 'wb') as file:
@@ -131,14 +151,10 @@ def scrape_and_save(website_urls, output_file, content_selector=None):
 
 
 if __name__ == '__main__':
-    # Define the extracted URLs
-    website_urls = {
-        "Home": "https://botpenguin.com/",
-        "Pricing": "https://botpenguin.com/chatbot-pricing",
-        "Partners": "https://botpenguin.com/partners/chatbot-affiliate-program",
-        "Ecommerce Industry": "https://botpenguin.com/chatbot-industry/ecommerce",
-        "Solutions": "https://botpenguin.com/solutions/custom-chatgpt-plugins",
-    }
+    from extract_url import load_site_urls
+
+    # URLs to scrape are listed per site in sites.json
+    website_urls = load_site_urls("sites.json")
 
     # Specify a CSS selector for the main content (if applicable)
     # Adjust the selector based on the structure of the website you're scraping
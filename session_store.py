@@ -0,0 +1,165 @@
+# session_store.py
+
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict, deque
+
+import metrics
+
+# Rough per-message overhead (dict, deque slot, role string) added to the text length
+_MESSAGE_OVERHEAD_BYTES = 200
+
+
+def count_words(text):
+    """
+    Default token estimate: whitespace-separated words.
+    """
+    return len(text.split())
+
+
+class SessionHistory:
+    """
+    One session's recent messages in a ring buffer capped by turns and tokens.
+    """
+    __slots__ = ('messages', 'tokens', 'size_bytes')
+
+    def __init__(self, max_messages):
+        self.messages = deque(maxlen=max_messages)  # (role, content, tokens)
+        self.tokens = 0
+        self.size_bytes = 0
+
+    def append(self, role, content, tokens, max_tokens):
+        if len(self.messages) == self.messages.maxlen:
+            self._drop_oldest()
+        self.messages.append((role, content, tokens))
+        self.tokens += tokens
+        self.size_bytes += len(content) + _MESSAGE_OVERHEAD_BYTES
+        # Keep the newest message even if it alone exceeds the token cap
+        while self.tokens > max_tokens and len(self.messages) > 1:
+            self._drop_oldest()
+
+    def _drop_oldest(self):
+        _, content, tokens = self.messages.popleft()
+        self.tokens -= tokens
+        self.size_bytes -= len(content) + _MESSAGE_OVERHEAD_BYTES
+
+
+class ConversationStore:
+    def __init__(self, max_turns=10, max_tokens=1000, memory_budget_mb=64, spill_dir=None, token_counter=count_words):
+        """
+        Session-keyed conversation histories with bounded memory.
+
+        Each session keeps at most `max_turns` user/assistant exchanges and
+        `max_tokens` tokens, dropping the oldest messages first. When the
+        histories of all sessions exceed the memory budget, the least recently
+        used sessions are evicted, or written to `spill_dir` and reloaded on
+        their next access. Lookups are O(1).
+
+        Args:
+            max_turns (int): Exchanges (user + assistant message) kept per session.
+            max_tokens (int): Tokens kept per session.
+            memory_budget_mb (float): Approximate memory for all in-memory sessions.
+            spill_dir (str): Directory for evicted sessions (optional; evicted sessions are dropped without it).
+            token_counter (callable): Counts the tokens in a message.
+        """
+        self.max_messages = max_turns * 2
+        self.max_tokens = max_tokens
+        self.memory_budget_bytes = int(memory_budget_mb * 2**20)
+        self.spill_dir = spill_dir
+        self.token_counter = token_counter
+        self._sessions = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def _spill_path(self, session_id):
+        digest = hashlib.sha1(str(session_id).encode('utf-8')).hexdigest()
+        return os.path.join(self.spill_dir, f"{digest}.pkl")
+
+    def _session(self, session_id, create):
+        """
+        Returns a session's history, reloading it from disk if it was spilled (caller holds the lock).
+        """
+        history = self._sessions.get(session_id)
+        if history is not None:
+            self._sessions.move_to_end(session_id)
+            return history
+
+        if self.spill_dir:
+            spill_path = self._spill_path(session_id)
+            if os.path.exists(spill_path):
+                with open(spill_path, 'rb') as file:
+                    messages = pickle.load(file)
+                os.remove(spill_path)
+                history = SessionHistory(self.max_messages)
+                for role, content, tokens in messages:
+                    history.append(role, content, tokens, self.max_tokens)
+                metrics.inc("session_reloads_total")
+
+        if history is None:
+            if not create:
+                return None
+            history = SessionHistory(self.max_messages)
+        self._sessions[session_id] = history
+        self._total_bytes += history.size_bytes
+        return history
+
+    def append(self, session_id, role, content):
+        """
+        Adds a message to a session, creating the session if needed.
+        """
+        tokens = self.token_counter(content)
+        with self._lock:
+            history = self._session(session_id, create=True)
+            size_before = history.size_bytes
+            history.append(role, content, tokens, self.max_tokens)
+            self._total_bytes += history.size_bytes - size_before
+            self._evict()
+
+    def get(self, session_id):
+        """
+        Returns a session's messages as [{"role": ..., "content": ...}], oldest first.
+        """
+        with self._lock:
+            history = self._session(session_id, create=False)
+            if history is None:
+                return []
+            # A session reloaded from disk may push others over the budget
+            self._evict()
+            return [{"role": role, "content": content} for role, content, _ in history.messages]
+
+    def clear(self, session_id):
+        """
+        Deletes a session from memory and disk.
+        """
+        with self._lock:
+            history = self._sessions.pop(session_id, None)
+            if history is not None:
+                self._total_bytes -= history.size_bytes
+            if self.spill_dir and os.path.exists(self._spill_path(session_id)):
+                os.remove(self._spill_path(session_id))
+
+    def _evict(self):
+        """
+        Evicts least recently used sessions until the budget is met (caller holds the lock).
+        """
+        while self._total_bytes > self.memory_budget_bytes and len(self._sessions) > 1:
+            session_id, history = self._sessions.popitem(last=False)
+            self._total_bytes -= history.size_bytes
+            metrics.inc("session_evictions_total")
+            if self.spill_dir:
+                with open(self._spill_path(session_id), 'wb') as file:
+                    pickle.dump(list(history.messages), file)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def stats(self):
+        """
+        Returns the in-memory session count and their estimated size.
+        """
+        with self._lock:
+            return {'sessions': len(self._sessions), 'memory_mb': self._total_bytes / 2**20}
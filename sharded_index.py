@@ -0,0 +1,269 @@
+# sharded_index.py
+
+import heapq
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import metrics
+from chatbot_module import build_routing, rank_chunks
+from index_manager import IndexManager
+
+
+def shard_name(url):
+    """
+    Maps a URL to its shard, one per domain, e.g. 'https://www.botpenguin.com/x' -> 'botpenguin.com'.
+    """
+    host = urlparse(url).netloc.lower().split(':')[0]
+    return host[4:] if host.startswith("www.") else host
+
+
+def estimate_index_bytes(data_store):
+    """
+    Approximates the memory held by one loaded shard: tensors plus chunk text.
+    """
+    total = 0
+    for section_name, section_data in data_store.items():
+        if section_name.startswith('_'):
+            continue
+        for key in ('embeddings', 'centroid', 'sub_centroids'):
+            tensor = section_data.get(key)
+            if tensor is not None:
+                total += tensor.element_size() * tensor.nelement()
+        total += sum(len(chunk) for chunk in section_data.get('chunks', []))
+    return total
+
+
+class ShardedIndex:
+    def __init__(self, root_dir="shards", embedding_model="all-MiniLM-L6-v2", memory_budget_mb=512, max_workers=8):
+        """
+        Per-site index shards that are built, refreshed and loaded independently.
+
+        Every shard is a versioned IndexManager directory under `root_dir`
+        (e.g. shards/botpenguin.com/). Shards are loaded on first use and the
+        least recently used ones are evicted once the loaded total exceeds
+        the memory budget.
+
+        Args:
+            root_dir (str): Directory holding one sub-directory per shard.
+            embedding_model (str): Embedding model every shard must be built with.
+            memory_budget_mb (float): Approximate memory allowed for loaded shards.
+            max_workers (int): Threads used to search shards in parallel.
+        """
+        self.root_dir = root_dir
+        self.embedding_model = embedding_model
+        self.memory_budget_bytes = int(memory_budget_mb * 2**20)
+        self._loaded = OrderedDict()  # shard -> ((data_store, routing), size_bytes)
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._managers = {}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="shard-search")
+        os.makedirs(root_dir, exist_ok=True)
+
+    def manager(self, shard):
+        """
+        Returns the shard's IndexManager, one per shard so its refresh lock is shared.
+        """
+        with self._lock:
+            manager = self._managers.get(shard)
+            if manager is None:
+                manager = self._managers[shard] = IndexManager(os.path.join(self.root_dir, shard))
+            return manager
+
+    def resolve(self, site):
+        """
+        Maps a client-supplied site (shard name or any URL on the site) to a live shard.
+
+        Only shards that exist on disk are accepted, so request input never
+        becomes a path or creates directories.
+
+        Returns:
+            str: The shard name, or None if there is no such shard.
+        """
+        if not site:
+            return None
+        shard = shard_name(site) if "://" in site else site.lower()
+        return shard if shard in self.shards() else None
+
+    def shards(self):
+        """
+        Lists shards that have a live version.
+        """
+        return sorted(
+            shard for shard in os.listdir(self.root_dir)
+            if os.path.exists(os.path.join(self.root_dir, shard, "CURRENT"))
+        )
+
+    def loaded_bytes(self):
+        with self._lock:
+            return sum(size for _, size in self._loaded.values())
+
+    def get(self, shard):
+        """
+        Returns a shard's (data_store, routing) index, loading it if needed.
+
+        Returns:
+            tuple: The shard index, or None if the shard has no usable version.
+        """
+        with self._lock:
+            entry = self._loaded.get(shard)
+            if entry is not None:
+                self._loaded.move_to_end(shard)
+                metrics.inc("shard_cache_hits_total")
+                return entry[0]
+
+        # Checked before any lock or manager is created for the name
+        if shard not in self.shards():
+            return None
+        with self._lock:
+            load_lock = self._load_locks.setdefault(shard, threading.Lock())
+
+        # Only one thread loads a given shard; others wait for it instead of loading it twice
+        with load_lock:
+            with self._lock:
+                entry = self._loaded.get(shard)
+                if entry is not None:
+                    self._loaded.move_to_end(shard)
+                    return entry[0]
+
+            metrics.inc("shard_loads_total")
+            with metrics.span("shard_load", item=shard):
+                data_store = self.manager(shard).load()
+            if data_store is None:
+                return None
+            if data_store.get('_embedding_model') != self.embedding_model:
+                print(f"Skipping shard {shard}: built with {data_store.get('_embedding_model')}, expected {self.embedding_model}.")
+                return None
+
+            index = (data_store, build_routing(data_store))
+            with self._lock:
+                self._loaded[shard] = (index, estimate_index_bytes(data_store))
+                self._evict()
+            return index
+
+    def _evict(self):
+        """
+        Drops least recently used shards until the budget is met (caller holds the lock).
+        """
+        total = sum(size for _, size in self._loaded.values())
+        while total > self.memory_budget_bytes and len(self._loaded) > 1:
+            shard, (_, size) = self._loaded.popitem(last=False)
+            total -= size
+            metrics.inc("shard_evictions_total")
+            print(f"Evicted shard {shard} ({size / 2**20:.1f} MB) to stay within the memory budget.")
+
+    def invalidate(self, shard):
+        """
+        Forgets a loaded shard so the next query loads its live version.
+        """
+        with self._lock:
+            self._loaded.pop(shard, None)
+
+    def search(self, input_vector, site=None, k=None, **rank_kwargs):
+        """
+        Searches one shard, or fans out to every shard in parallel and merges the results.
+
+        Args:
+            input_vector (torch.Tensor): Encoded query.
+            site (str): Shard name or any URL on the site; None searches all shards.
+                Unknown sites match nothing.
+            k (int): Number of results to return; None returns every match, as an
+                unsharded index does.
+            **rank_kwargs: Passed on to chatbot_module.rank_chunks (top_n, threshold, ...).
+
+        Returns:
+            list: (score, "shard: section", chunk_index, chunk_text) tuples, best first.
+        """
+        if site:
+            shard = self.resolve(site)
+            if shard is None:
+                metrics.inc("shard_unknown_site_total")
+                return []
+            targets = [shard]
+        else:
+            targets = self.shards()
+
+        def search_shard(shard):
+            index = self.get(shard)
+            if index is None:
+                return []
+            return [
+                (score, f"{shard}: {section}", chunk_index, chunk)
+                for score, section, chunk_index, chunk in rank_chunks(input_vector, index, **rank_kwargs)
+            ]
+
+        if len(targets) == 1:
+            merged = search_shard(targets[0])
+        else:
+            merged = []
+            for results in self._pool.map(search_shard, targets):
+                merged.extend(results)
+
+        if k is None:
+            return sorted(merged, key=lambda match: match[0], reverse=True)
+        return heapq.nlargest(k, merged, key=lambda match: match[0])
+
+    def refresh_shard(self, shard, site_urls, **build_kwargs):
+        """
+        Rebuilds one shard without touching the others.
+
+        Queries keep using the loaded version until the new one is promoted;
+        after that the shard is reloaded lazily on its next query.
+
+        Returns:
+            str: The promoted version, or None if the refresh failed.
+        """
+        build_kwargs.setdefault('embedding_model', self.embedding_model)
+        version = self.manager(shard).refresh(site_urls=site_urls, **build_kwargs)
+        if version:
+            self.invalidate(shard)
+        return version
+
+    def rollback_shard(self, shard):
+        """
+        Restores a shard's previous version.
+        """
+        version = self.manager(shard).rollback()
+        if version:
+            self.invalidate(shard)
+        return version
+
+
+def group_by_shard(site_urls):
+    """
+    Splits a {label: url} mapping into one mapping per shard.
+    """
+    grouped = {}
+    for label, url in site_urls.items():
+        grouped.setdefault(shard_name(url), {})[label] = url
+    return grouped
+
+
+if __name__ == "__main__":
+    """
+    Usage:
+        python sharded_index.py build sites.json [shard]
+        python sharded_index.py stats
+    """
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    sharded_index = ShardedIndex("shards")
+
+    if command == "build":
+        with open(sys.argv[2] if len(sys.argv) > 2 else "sites.json") as file:
+            sites = json.load(file)
+        only_shard = sys.argv[3] if len(sys.argv) > 3 else None
+        for site, urls in sites.items():
+            for shard, shard_urls in group_by_shard(urls).items():
+                if only_shard and shard != only_shard:
+                    continue
+                print(f"Building shard {shard} ({site}, {len(shard_urls)} pages)...")
+                sharded_index.refresh_shard(shard, shard_urls, selector="main", segment_size=300, min_words=30)
+    else:
+        for shard in sharded_index.shards():
+            index = sharded_index.get(shard)
+            if index is not None:
+                print(f"{shard}: version {index[0].get('_index_version')}, ~{estimate_index_bytes(index[0]) / 2**20:.1f} MB")
@@ -0,0 +1,81 @@
+import pytest
+
+import context_packer
+from context_packer import ContextPacker
+
+TEMPLATE = "Context: {context}\nQuestion: {query}\nAnswer:"
+
+
+@pytest.fixture
+def make_packer(monkeypatch):
+    # Word-estimate token counts, so the tests need neither the tokenizer nor the network
+    monkeypatch.setattr(context_packer, "load_tokenizer", lambda model_id: None)
+
+    def make(max_input_tokens=60, max_chunks=5):
+        return ContextPacker(max_input_tokens=max_input_tokens, max_chunks=max_chunks)
+    return make
+
+
+def _ranked(*chunks):
+    return [(1.0 - position / 10, "Section", position, chunk) for position, chunk in enumerate(chunks)]
+
+
+def test_prompt_never_exceeds_the_limit(make_packer):
+    packer = make_packer(max_input_tokens=60)
+    chunks = [" ".join(f"Sentence {n} of chunk {c} is here." for n in range(6)) for c in range(4)]
+
+    prompt, stats = packer.pack(_ranked(*chunks), TEMPLATE, "What is in the chunks?")
+
+    assert packer.count_prompt_tokens(prompt) == stats['tokens_sent'] <= 60
+    assert stats['chunks_packed'] >= 1
+    assert stats['chunks_trimmed'] == 1
+    assert not stats['query_truncated']
+
+
+def test_duplicate_chunks_and_sentences_are_skipped(make_packer):
+    packer = make_packer(max_input_tokens=200)
+    ranked = _ranked(
+        "Plans start at ten dollars. Support is included.",
+        "plans start at  ten dollars. Support is included.",
+        "Support is included. The pro plan adds analytics.",
+    )
+
+    prompt, stats = packer.pack(ranked, TEMPLATE, "How much does it cost?")
+
+    assert stats['chunks_packed'] == 2
+    assert prompt.count("Support is included.") == 1
+    assert "The pro plan adds analytics." in prompt
+
+
+def test_first_sentence_over_budget_is_cut_at_a_word(make_packer):
+    packer = make_packer(max_input_tokens=40)
+    long_sentence = " ".join(f"word{n}" for n in range(100)) + "."
+
+    prompt, stats = packer.pack(_ranked(long_sentence), TEMPLATE, "What?")
+
+    assert stats['chunks_packed'] == 1
+    assert "word0 word1" in prompt and "word99" not in prompt
+    assert stats['tokens_sent'] <= 40
+
+
+def test_over_long_query_is_truncated_to_fit(make_packer):
+    packer = make_packer(max_input_tokens=60)
+    query = " ".join(f"q{n}" for n in range(600))
+
+    prompt, stats = packer.pack(_ranked("Plans start at ten dollars."), TEMPLATE, query)
+
+    assert stats['query_truncated']
+    assert stats['tokens_sent'] <= 60
+    assert prompt.startswith("Context: \nQuestion: q0 q1")
+    assert "q599" not in prompt
+
+
+def test_no_chunks_leaves_an_empty_context(make_packer):
+    packer = make_packer()
+
+    prompt, stats = packer.pack([], TEMPLATE, "Hello?")
+
+    assert prompt == TEMPLATE.format(context="", query="Hello?")
+    assert stats['chunks_packed'] == 0
+    assert stats['context_tokens'] == 0
+    assert stats['context_tokens_offered'] == 0
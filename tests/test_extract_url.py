@@ -0,0 +1,93 @@
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from extract_url import extract_sitemap_urls, iter_sitemap_entries, load_site_urls
+
+_NS = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" xmlns:image="http://www.google.com/schemas/sitemap-image/1.1"'
+
+
+def _site_files(host):
+    pages = (
+        f'<?xml version="1.0"?><urlset {_NS}>'
+        f'<url><loc>http://{host}/pricing</loc><lastmod>2024-02-01</lastmod>'
+        f'<image:image><image:loc>http://{host}/logo.png</image:loc></image:image></url>'
+        f'<url><loc>http://{host}/about</loc></url>'
+        '</urlset>'
+    )
+    blog = f'<?xml version="1.0"?><urlset {_NS}><url><loc>http://{host}/blog</loc><lastmod>2024-03-01</lastmod></url></urlset>'
+    index = (
+        f'<?xml version="1.0"?><sitemapindex {_NS}>'
+        f'<sitemap><loc>http://{host}/pages.xml.gz</loc></sitemap>'
+        f'<sitemap><loc>http://{host}/blog.xml</loc></sitemap>'
+        '</sitemapindex>'
+    )
+    return {
+        "/robots.txt": f"User-agent: *\nSitemap: http://{host}/sitemap_index.xml.gz\n".encode(),
+        "/sitemap_index.xml.gz": gzip.compress(index.encode()),
+        "/pages.xml.gz": gzip.compress(pages.encode()),
+        "/blog.xml": blog.encode(),
+    }
+
+
+@pytest.fixture
+def sitemap_site():
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = _site_files(self.headers.get("Host")).get(self.path)
+            if body is None:
+                return self.send_error(404)
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def test_gzipped_sitemap_index_is_followed(sitemap_site):
+    entries = list(iter_sitemap_entries(f"{sitemap_site}/sitemap_index.xml.gz"))
+    assert entries == [
+        (f"{sitemap_site}/pricing", "2024-02-01"),
+        (f"{sitemap_site}/about", None),
+        (f"{sitemap_site}/blog", "2024-03-01"),
+    ]
+
+
+def test_lastmod_state_detects_changes_without_saving(sitemap_site):
+    all_urls, changed, state = extract_sitemap_urls(f"{sitemap_site}/")
+    assert len(all_urls) == 3 and len(changed) == 3
+
+    # Pages without <lastmod> always count as changed
+    _, changed, _ = extract_sitemap_urls(f"{sitemap_site}/", previous_state=state)
+    assert changed == [f"{sitemap_site}/about"]
+
+    # Nothing was persisted by discovery itself
+    _, changed, _ = extract_sitemap_urls(f"{sitemap_site}/")
+    assert len(changed) == 3
+
+
+def test_load_site_urls_keeps_pages_of_sites_sharing_labels(tmp_path):
+    sites_file = tmp_path / "sites.json"
+    sites_file.write_text(json.dumps({
+        "Acme": {"Homepage": "https://acme.example/", "Pricing": "https://acme.example/pricing"},
+        "Globex": {"Homepage": "https://globex.example/"},
+    }))
+
+    assert load_site_urls(str(sites_file)) == {
+        "Acme - Homepage": "https://acme.example/",
+        "Acme - Pricing": "https://acme.example/pricing",
+        "Globex - Homepage": "https://globex.example/",
+    }
+    assert load_site_urls(str(sites_file), "Globex") == {"Homepage": "https://globex.example/"}
+    with pytest.raises(ValueError, match="Initech"):
+        load_site_urls(str(sites_file), "Initech")
@@ -0,0 +1,122 @@
+import os
+import pickle
+
+import torch
+
+from index_manager import IndexManager, merge_discovered_urls
+
+
+def test_merge_discovered_urls_keeps_one_section_per_page():
+    site_urls = {"Plans": "https://example.com/chatbot-pricing", "Home": "https://example.com/"}
+    discovered = {
+        "Chatbot Pricing": "https://example.com/chatbot-pricing/",
+        "Home": "https://example.com",
+        "Blog": "https://example.com/blog",
+    }
+
+    merged, sitemap_urls, changed = merge_discovered_urls(site_urls, discovered, {"Chatbot Pricing", "Blog"})
+
+    assert merged == {
+        "Plans": "https://example.com/chatbot-pricing",
+        "Home": "https://example.com/",
+        "Blog": "https://example.com/blog",
+    }
+    # Explicit pages keep their label but are still matched to their sitemap entry
+    assert sitemap_urls == {
+        "Plans": "https://example.com/chatbot-pricing/",
+        "Home": "https://example.com",
+        "Blog": "https://example.com/blog",
+    }
+    assert changed == {"Plans", "Blog"}
+
+
+def test_merge_discovered_urls_renames_label_clashes():
+    site_urls = {"Blog": "https://example.com/news"}
+    discovered = {"Blog": "https://example.com/blog"}
+
+    merged, sitemap_urls, changed = merge_discovered_urls(site_urls, discovered, set())
+
+    assert merged == {"Blog": "https://example.com/news", "Blog (https://example.com/blog)": "https://example.com/blog"}
+    assert sitemap_urls == {"Blog (https://example.com/blog)": "https://example.com/blog"}
+    assert changed == set()
+
+
+def _add_version(index_manager, version, embedding_model="tiny-model"):
+    os.makedirs(index_manager.version_dir(version))
+    processed_data = {
+        "Pricing": {"chunks": [f"Pricing in {version}."], "embeddings": torch.ones(1, 4)},
+        "_embedding_model": embedding_model,
+        "_index_version": version,
+    }
+    with open(os.path.join(index_manager.version_dir(version), "processed_data.pkl"), "wb") as file:
+        pickle.dump(processed_data, file)
+
+
+class _Assistant:
+    def __init__(self, data_store):
+        self.data_store = data_store
+        self.answer_table = "stale"
+
+    def swap_data_store(self, data_store):
+        self.data_store = data_store
+
+    def set_answer_table(self, answer_table):
+        self.answer_table = answer_table
+
+
+def test_promote_records_history_and_prunes_old_versions(tmp_path):
+    index_manager = IndexManager(str(tmp_path / "index"), keep_versions=2)
+    for version in ("v1", "v2", "v3"):
+        _add_version(index_manager, version)
+    _add_version(index_manager, "v9")  # newer and unpromoted: still building
+
+    for version in ("v1", "v2", "v3"):
+        index_manager.promote(version)
+
+    assert index_manager.current_version() == "v3"
+    assert index_manager.load()["_index_version"] == "v3"
+    assert sorted(os.listdir(index_manager.versions_dir)) == ["v2", "v3", "v9"]
+
+
+def test_rollback_twice_walks_back_through_history(tmp_path):
+    index_manager = IndexManager(str(tmp_path / "index"), keep_versions=3)
+    for version in ("v1", "v2", "v3"):
+        _add_version(index_manager, version)
+        index_manager.promote(version)
+    assistant = _Assistant(index_manager.load())
+
+    assert index_manager.rollback(assistant) == "v2"
+    assert index_manager.current_version() == "v2"
+    assert assistant.data_store["_index_version"] == "v2"
+    assert assistant.answer_table is None
+
+    assert index_manager.rollback(assistant) == "v1"
+    assert index_manager.current_version() == "v1"
+    assert assistant.data_store["_index_version"] == "v1"
+
+    assert index_manager.rollback(assistant) is None
+    assert index_manager.current_version() == "v1"
+
+
+def test_rollback_to_another_embedding_model_keeps_the_live_version(tmp_path):
+    index_manager = IndexManager(str(tmp_path / "index"))
+    _add_version(index_manager, "v1", embedding_model="old-model")
+    index_manager.promote("v1")
+    _add_version(index_manager, "v2")
+    index_manager.promote("v2")
+    assistant = _Assistant(index_manager.load())
+
+    assert index_manager.rollback(assistant) is None
+    assert index_manager.current_version() == "v2"
+    assert index_manager.rollback() == "v1"
+
+
+def test_rollback_waits_for_a_running_refresh(tmp_path):
+    index_manager = IndexManager(str(tmp_path / "index"))
+    for version in ("v1", "v2"):
+        _add_version(index_manager, version)
+        index_manager.promote(version)
+
+    with index_manager._refresh_lock:
+        assert index_manager.rollback() is None
+    assert index_manager.current_version() == "v2"
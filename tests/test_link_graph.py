@@ -0,0 +1,57 @@
+import pickle
+
+from link_graph import LinkGraph
+from scraper_mod import plan_crawl
+
+HOME = "https://example.com/"
+PRICING = "https://example.com/pricing"
+BLOG = "https://example.com/blog"
+ABOUT = "https://example.com/about"
+
+
+def _sample_graph():
+    graph = LinkGraph()
+    graph.add_page(HOME, [PRICING, BLOG, PRICING + "#faq"])
+    graph.add_page(BLOG, [PRICING, HOME])
+    graph.add_page(ABOUT, [PRICING, BLOG])
+    return graph
+
+
+def test_pickle_round_trip_keeps_links_and_lookup():
+    graph = _sample_graph()
+
+    restored = pickle.loads(pickle.dumps(graph))
+
+    assert restored.urls == graph.urls
+    assert restored.num_edges == graph.num_edges == 6
+    assert restored.out_links(HOME) == [PRICING, BLOG]
+    assert restored.in_degree(PRICING) == 3
+    assert PRICING + "#faq" in restored
+    # The id lookup is rebuilt, so new URLs get fresh ids after loading
+    assert restored.intern("https://example.com/new") == len(graph.urls)
+
+
+def test_re_adding_a_page_replaces_its_links_on_compaction():
+    graph = _sample_graph()
+    assert graph.num_edges == 6
+
+    graph.add_page(BLOG, [ABOUT])
+    graph.add_page(PRICING, [HOME])
+
+    assert graph.out_links(BLOG) == [ABOUT]
+    assert graph.out_links(PRICING) == [HOME]
+    assert graph.out_links(HOME) == [PRICING, BLOG]
+    assert graph.num_edges == 6
+    assert graph.in_degree(PRICING) == 2
+    assert graph.in_degree(HOME) == 1
+
+
+def test_crawl_order_puts_most_linked_pages_first():
+    graph = _sample_graph()
+    site_urls = {"About": ABOUT, "Unknown": "https://example.com/unknown", "Home": HOME, "Pricing": PRICING}
+
+    assert plan_crawl(site_urls, graph) == [
+        ("Pricing", PRICING), ("Home", HOME), ("About", ABOUT), ("Unknown", "https://example.com/unknown")
+    ]
+    assert plan_crawl(site_urls, graph, page_budget=2) == [("Pricing", PRICING), ("Home", HOME)]
+    assert plan_crawl(site_urls, page_budget=1) == [("About", ABOUT)]
@@ -0,0 +1,41 @@
+from page_archive import PageArchive
+
+
+def test_append_and_get_round_trip(tmp_path):
+    archive_path = str(tmp_path / "pages.warc.zst")
+    body = "<html><body>Pricing – plans</body></html>".encode('utf-8')
+
+    with PageArchive(archive_path) as archive:
+        archive.append("https://example.com/pricing", 200, {"Content-Type": "text/html"}, body, encoding="utf-8")
+        record = archive.get("https://example.com/pricing")
+
+    assert record['url'] == "https://example.com/pricing"
+    assert record['status_code'] == 200
+    assert record['headers']['Content-Type'] == "text/html"
+    assert record['body'] == body
+    assert record['encoding'] == "utf-8"
+
+
+def test_reopened_archive_keeps_latest_record_per_url(tmp_path):
+    archive_path = str(tmp_path / "pages.warc.zst")
+    with PageArchive(archive_path) as archive:
+        archive.append("https://example.com/a", 200, {}, b"first")
+        archive.append("https://example.com/b", 404, {}, b"missing")
+        archive.append("https://example.com/a", 200, {}, b"second")
+
+    with PageArchive(archive_path) as archive:
+        assert archive.urls() == ["https://example.com/a", "https://example.com/b"]
+        assert archive.get("https://example.com/a")['body'] == b"second"
+        assert archive.get("https://example.com/b")['status_code'] == 404
+        assert archive.get("https://example.com/c") is None
+
+
+def test_torn_index_line_is_ignored(tmp_path):
+    archive_path = str(tmp_path / "pages.warc.zst")
+    with PageArchive(archive_path) as archive:
+        archive.append("https://example.com/a", 200, {}, b"body")
+    with open(f"{archive_path}.idx", 'a', encoding='utf-8') as index_file:
+        index_file.write('{"url": "https://example.com/b", "off')
+
+    with PageArchive(archive_path) as archive:
+        assert archive.urls() == ["https://example.com/a"]
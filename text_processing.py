@@ -1,8 +1,15 @@
 import re
+import sys
 import pickle
 import numpy as np
+import torch
 from sentence_transformers import SentenceTransformer
 
+import metrics
+from link_graph import normalize_url
+
+DEFAULT_EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+
 def strip_html_tags(raw_text):
     """
     Removes HTML tags from the input text using a regex.
@@ -66,89 +73,185 @@ def prune_segments(segments, threshold=50):
     """
     return [seg for seg in segments if len(seg.split()) >= threshold and any(c.isalnum() for c in seg)]
 
-def generate_embeddings(segments, model_type='all-MiniLM-L6-v2'):
+def generate_embeddings(segments, model_type=DEFAULT_EMBEDDING_MODEL, model=None):
     """
     Generates embeddings for text segments using a sentence-transformers model.
 
     Args:
         segments (list): Text segments to embed.
         model_type (str): SentenceTransformer model name.
+        model (SentenceTransformer): Already loaded model to reuse (optional).
 
     Returns:
         tuple: Embeddings and model instance.
     """
-    model = SentenceTransformer(model_type)
+    if model is None:
+        model = SentenceTransformer(model_type)
     embeddings = model.encode(segments, convert_to_tensor=True)
     return embeddings, model
 
+def compute_section_centroids(embeddings, sub_centroids=0, iterations=10):
+    """
+    Summarizes a section's chunk embeddings for coarse query routing.
+
+    The centroid is the normalized mean of the normalized embeddings. Sub-centroids
+    come from a few rounds of spherical k-means and help sections whose chunks
+    cover several distinct topics.
+
+    Args:
+        embeddings (torch.Tensor): Chunk embeddings of shape [num_chunks, embedding_dim].
+        sub_centroids (int): Number of sub-centroids to compute (0 to skip).
+        iterations (int): k-means iterations for the sub-centroids.
+
+    Returns:
+        tuple: Centroid of shape [embedding_dim] and sub-centroids of shape [k, embedding_dim] (or None).
+    """
+    normalized = torch.nn.functional.normalize(embeddings.float(), dim=-1)
+    centroid = torch.nn.functional.normalize(normalized.mean(dim=0), dim=-1)
+
+    k = min(sub_centroids, normalized.shape[0])
+    if k < 2:
+        return centroid, None
+
+    # Seed with evenly spaced chunks, which follow the page order
+    seeds = torch.linspace(0, normalized.shape[0] - 1, k).long()
+    centers = normalized[seeds].clone()
+    for _ in range(iterations):
+        assignments = (normalized @ centers.T).argmax(dim=1)
+        for cluster in range(k):
+            members = normalized[assignments == cluster]
+            if len(members):
+                centers[cluster] = torch.nn.functional.normalize(members.mean(dim=0), dim=-1)
+    return centroid, centers
+
+def ensure_section_centroids(processed_data, sub_centroids=0):
+    """
+    Adds routing centroids to processed data built before they were precomputed.
+
+    Args:
+        processed_data (dict): Output of prepare_data.
+        sub_centroids (int): Number of sub-centroids per section.
+
+    Returns:
+        dict: The same processed data, updated in place.
+    """
+    for section_name, section_data in processed_data.items():
+        if section_name.startswith('_') or 'centroid' in section_data:
+            continue
+        if not section_data.get('chunks'):
+            continue
+        centroid, section_sub_centroids = compute_section_centroids(section_data['embeddings'], sub_centroids)
+        section_data['centroid'] = centroid
+        section_data['sub_centroids'] = section_sub_centroids
+    return processed_data
+
 def prepare_data(
-    scraped_content,
-    embedding_model='all-MiniLM-L6-v2',
+    scraped_content=None,
+    embedding_model=DEFAULT_EMBEDDING_MODEL,
     segment_size=500,
-    min_words=50
+    min_words=50,
+    archive_path=None,
+    site_urls=None,
+    selector=None,
+    sub_centroids=0
 ):
     """
     Prepares scraped content for QA by cleaning, segmenting, filtering, and embedding.
 
     Args:
-        scraped_content (dict): Sections with their content and links.
+        scraped_content (dict): Sections with their content and URL, plus the crawl's '_link_graph'.
         embedding_model (str): SentenceTransformer model name.
         segment_size (int): Approximate word count for each segment.
         min_words (int): Minimum word threshold for segments.
+        archive_path (str): Page archive to replay when `scraped_content` is not given (optional).
+        site_urls (dict): Section labels and URLs to replay from the archive (optional).
+        selector (str): CSS selector applied when replaying the archive (optional).
+        sub_centroids (int): Sub-centroids to precompute per section for retrieval routing.
 
     Returns:
-        dict: Processed data with chunks, embeddings, and links.
+        dict: Processed data with chunks, embeddings, routing centroids, and link priors.
     """
+    if scraped_content is None and archive_path:
+        # Imported here so serving (chatbot_module -> text_processing) does not need the scraping stack
+        from scraper_mod import replay_archive
+        scraped_content = replay_archive(archive_path, site_urls, selector)
+
     if not scraped_content:
         return None
 
+    # Pages many others link to get a small boost at retrieval time
+    link_graph = scraped_content.get('_link_graph')
+    link_priors = link_graph.link_priors() if link_graph is not None else {}
+
     structured_data = {}
+    encoder = None
     for section_name, data in scraped_content.items():
-        original_text = data.get('context', '')
-        associated_links = data.get('links', {})
+        if section_name.startswith('_'):
+            continue
+        # Selenium/scraper_module output uses 'context', scraper_mod output uses 'text'
+        original_text = data.get('context', data.get('text', ''))
+        page_url = data.get('url')
 
         # Clean text
-        refined_text = cleanse_text(original_text)
+        with metrics.span("cleanse_text", item=section_name):
+            refined_text = cleanse_text(original_text)
 
         # Segment text
-        text_segments = segment_text(refined_text, size=segment_size)
+        with metrics.span("segment_text", item=section_name):
+            text_segments = segment_text(refined_text, size=segment_size)
 
-        # Prune invalid segments
-        text_segments = prune_segments(text_segments, threshold=min_words)
+            # Prune invalid segments
+            text_segments = prune_segments(text_segments, threshold=min_words)
 
         if not text_segments:
             print(f"No valid segments found for section: {section_name}")
             continue
 
         # Embed segments
-        segment_embeddings, _ = generate_embeddings(text_segments, model_type=embedding_model)
+        with metrics.span("generate_embeddings", item=section_name):
+            segment_embeddings, encoder = generate_embeddings(text_segments, model_type=embedding_model, model=encoder)
+        metrics.inc("chunks_embedded_total", len(text_segments))
+
+        # Summarize the section so queries can skip it without scoring every chunk
+        centroid, section_sub_centroids = compute_section_centroids(segment_embeddings, sub_centroids)
 
         structured_data[section_name] = {
             'chunks': text_segments,
             'embeddings': segment_embeddings,
-            'links': associated_links
+            'centroid': centroid,
+            'sub_centroids': section_sub_centroids,
+            'url': page_url,
+            'link_prior': link_priors.get(normalize_url(page_url), 0.0) if page_url else 0.0
         }
 
     structured_data['_embedding_model'] = embedding_model
+    # Lets an incremental build tell whether older sections were chunked the same way
+    structured_data['_chunking'] = {'segment_size': segment_size, 'min_words': min_words, 'sub_centroids': sub_centroids}
     return structured_data
 
 if __name__ == "__main__":
     """
     Example usage to process scraped data and store embeddings.
     """
-    try:
-        with open("data.pkl", "rb") as raw_file:
-            raw_content = pickle.load(raw_file)
-    except FileNotFoundError:
-        print("Missing 'data.pkl'. Run the scraper module first.")
-        raw_content = None
+    if '--replay' in sys.argv:
+        from scraper_mod import replay_archive
+        # Rebuild straight from the raw page archive, no network needed
+        raw_content = replay_archive("pages.warc.zst", selector="main")
+    else:
+        try:
+            with open("data.pkl", "rb") as raw_file:
+                raw_content = pickle.load(raw_file)
+        except FileNotFoundError:
+            print("Missing 'data.pkl'. Run the scraper module first.")
+            raw_content = None
 
     if raw_content:
         processed_output = prepare_data(
             scraped_content=raw_content,
-            embedding_model='all-MiniLM-L6-v2',
+            embedding_model=DEFAULT_EMBEDDING_MODEL,
             segment_size=500,
-            min_words=50
+            min_words=50,
+            sub_centroids=4
         )
         with open("processed_data.pkl", "wb") as output_file:
             pickle.dump(processed_output, output_file)